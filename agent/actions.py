@@ -1,9 +1,22 @@
+import re
 import time
-from utils import load_data, save_data, log_event
+from config import (RISK_THRESHOLD, FRAUD_URL, FRAUD_TIMEOUT_MS, FRAUD_FAIL_MODE,
+                    FRAUD_CACHE_TTL)
+from utils import log_event
+from store import get_store
+from fraud_client import FraudScorer
 
-def validate_action(auth_customer_id, action, params):
+fraud_scorer = FraudScorer(FRAUD_URL, FRAUD_TIMEOUT_MS, FRAUD_FAIL_MODE,
+                           RISK_THRESHOLD, FRAUD_CACHE_TTL)
+
+_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def validate_action(auth_customer_id, action, params, data_path=None):
     """
     Validate an action request before execution.
+    Transfers that pass the static rules are also scored by the fraud
+    service when FRAUD_URL is configured (needs `data_path`).
     Returns (is_valid: bool, reason: str)
     """
     if action == "transfer":
@@ -26,6 +39,27 @@ def validate_action(auth_customer_id, action, params):
         if amt <= 0:
             return False, "Invalid transfer amount."
 
+        # ---- Real-time fraud scoring ----
+        if fraud_scorer.enabled and data_path:
+            src = get_store(data_path).by_customer_id(auth_customer_id)
+            if src:
+                return fraud_scorer.check_transfer(src, to, amt)
+
+    elif action == "get_transactions":
+        # Params come straight from the model; the index compares them as strings
+        try:
+            int(params.get("n", 3))
+        except (ValueError, TypeError):
+            return False, "Invalid transaction count."
+        for key in ("since", "until"):
+            value = params.get(key)
+            if value is not None and not (isinstance(value, str) and _DATE.fullmatch(value)):
+                return False, f"Invalid {key} date, expected YYYY-MM-DD."
+        for key in ("cursor", "counterparty"):
+            value = params.get(key)
+            if value is not None and not isinstance(value, str):
+                return False, f"Invalid {key}."
+
     elif action == "freeze_account":
         # Add demo rule examples later
         pass
@@ -36,12 +70,12 @@ def validate_action(auth_customer_id, action, params):
 
 def perform_action(action, params, data_path, auth_customer_id):
     log_event(f"Performing {action}", auth_customer_id)
-    data = load_data(data_path)
+    store = get_store(data_path)
     ts = int(time.time())
     result = {"status": "simulated", "timestamp": ts}
 
     # Get source customer
-    src = next((c for c in data["customers"] if c["customer_id"] == auth_customer_id), None)
+    src = store.by_customer_id(auth_customer_id)
     if not src:
         return {"error": "Authenticated customer not found"}
 
@@ -53,33 +87,15 @@ def perform_action(action, params, data_path, auth_customer_id):
         except Exception:
             return {"error": "Invalid amount format"}
 
-        dst = next((c for c in data["customers"] if c["customer_id"] == dst_id), None)
+        dst = store.by_customer_id(dst_id)
         if not dst:
             log_event(f"perform action - transfer - to ID not found: ",dst_id)
             return {"error": f"Destination {dst_id} not found"}
 
-        if src["account"]["balance"] >= amount > 0:
-            src["account"]["balance"] -= amount
-            dst["account"]["balance"] += amount
-            tx_id = f"TX-{ts}"
-            today = time.strftime("%Y-%m-%d")
-
-            src["transactions"].append({
-                "tx_id": tx_id,
-                "date": today,
-                "amount": -amount,
-                "description": f"Transfer to {dst_id}"
-            })
-            dst["transactions"].append({
-                "tx_id": tx_id,
-                "date": today,
-                "amount": amount,
-                "description": f"Transfer from {auth_customer_id}"
-            })
-
-            save_data(data_path, data)
+        entry = store.transfer(auth_customer_id, dst_id, amount)
+        if entry:
             result.update({
-                "tx_id": tx_id,
+                "tx_id": entry["tx_id"],
                 "from": auth_customer_id,
                 "to": dst_id,
                 "amount": amount,
@@ -99,9 +115,15 @@ def perform_action(action, params, data_path, auth_customer_id):
     # ---- GET TRANSACTIONS ----
     elif action == "get_transactions":
         n = int(params.get("n", 3))
-        txs = sorted(src.get("transactions", []),
-                     key=lambda t: t.get("date"), reverse=True)[:n]
+        try:
+            txs, next_cursor = store.recent_transactions(
+                auth_customer_id, n, cursor=params.get("cursor"), since=params.get("since"),
+                until=params.get("until"), counterparty=params.get("counterparty"))
+        except ValueError:
+            return {"error": "Invalid cursor"}
         result.update({"customer_id": auth_customer_id, "transactions": txs})
+        if next_cursor:
+            result["next_cursor"] = next_cursor
 
     # ---- GET CUSTOMER INFO ----
     elif action == "get_customer_info":
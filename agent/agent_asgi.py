@@ -0,0 +1,203 @@
+"""Asyncio serving mode for the banking agent.
+
+Same /chat contract as agent_server.py, but LLM calls are non-blocking and
+share a keep-alive httpx connection pool, so one process can hold hundreds
+of in-flight generations. Run with:
+
+    uvicorn agent_asgi:app --host 0.0.0.0 --port 5003
+"""
+import asyncio
+import json
+import time
+
+import httpx
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from config import (LLM_URL, DATA_PATH, LLM_TIMEOUT, LLM_MAX_CONCURRENCY,
+                    LLM_POOL_SIZE, CHAT_DEADLINE, LLM_STREAM, RATE_LIMIT_STORAGE,
+                    RATE_LIMIT_STRATEGY, CHAT_RATE_LIMIT)
+from utils import log_event, new_request_id, request_id_var
+from auth import validate_token, check_eval_token
+from pipeline import (describe_prompt, llm_request, cached_intent, extract_intent, handle_intent,
+                      SYSTEM_PROMPT_ID)
+from store import get_store
+from extractor import ActionStreamParser
+from metrics import stage, render, CHAT_REQUESTS
+from rate_limit import RateLimiter, key_for
+
+_client = None
+_slots = None
+# Same limits, storage and keys as the Flask app's Limiter
+_limiter = RateLimiter(RATE_LIMIT_STORAGE, RATE_LIMIT_STRATEGY)
+
+
+async def _startup():
+    global _client, _slots
+    get_store(DATA_PATH)
+    _client = httpx.AsyncClient(
+        timeout=httpx.Timeout(LLM_TIMEOUT),
+        limits=httpx.Limits(max_connections=LLM_POOL_SIZE,
+                            max_keepalive_connections=LLM_POOL_SIZE),
+    )
+    _slots = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+
+async def _shutdown():
+    await _client.aclose()
+
+
+async def _call_llm(user_prompt, lane="interactive"):
+    payload = llm_request(user_prompt)
+    headers = {"X-Request-ID": request_id_var.get() or "", "X-Priority": lane}
+    async with _slots:
+        if not LLM_STREAM:
+            r = await _client.post(LLM_URL, json=payload, headers=headers)
+            return r.json().get("output", "")
+
+        # Stop reading (and thus generating) once a full action object arrived
+        parser, parts = ActionStreamParser(), []
+        async with _client.stream("POST", LLM_URL,
+                                  json=dict(payload, stream=True), headers=headers) as r:
+            async for line in r.aiter_lines():
+                if not line:
+                    continue
+                piece = json.loads(line).get("output", "")
+                parts.append(piece)
+                if parser.feed(piece):
+                    break
+        return "".join(parts)
+
+
+async def _wait_for_disconnect(request):
+    # The body has already been read, so the next message is the disconnect
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def health(request):
+    return JSONResponse({"status": "ok"})
+
+
+async def metrics(request):
+    body, content_type = render()
+    return Response(body, headers={"Content-Type": content_type})
+
+
+async def eval_chat(request):
+    # Red-team evaluation: same pipeline on the proxy's batch lane, never executes actions
+    if not check_eval_token(request.headers.get("X-Eval-Token")):
+        return JSONResponse({"error": "Not found"}, status_code=404)
+    return await chat(request, lane="batch", dry_run=True)
+
+
+async def chat_limited(request):
+    # Blocking socket call with window:// storage, so off the event loop
+    key = await run_in_threadpool(key_for, request.headers.get("Authorization"),
+                                  request.client.host if request.client else "127.0.0.1")
+    if not await run_in_threadpool(_limiter.hit, CHAT_RATE_LIMIT, key, "chat"):
+        CHAT_REQUESTS.labels("rate_limited").inc()
+        return JSONResponse({"error": f"Rate limit exceeded: {CHAT_RATE_LIMIT}"}, status_code=429)
+    return await chat(request)
+
+
+async def eval_info(request):
+    if not check_eval_token(request.headers.get("X-Eval-Token")):
+        return JSONResponse({"error": "Not found"}, status_code=404)
+    return JSONResponse({"system_prompt_id": SYSTEM_PROMPT_ID})
+
+
+async def chat(request, lane="interactive", dry_run=False):
+    new_request_id(request.headers.get("X-Request-ID"))
+    started = time.perf_counter()
+    response = await _chat(request, lane, dry_run)
+    # Closes the request's timeline for log_profiler.py
+    log_event({"event": "chat_done", "status": response.status_code,
+               "ms": round((time.perf_counter() - started) * 1000, 1)})
+    return response
+
+
+async def _chat(request, lane, dry_run):
+    # --- Authenticate user ---
+    header_token = request.headers.get("Authorization")
+    with stage("auth"):
+        user, err = validate_token(header_token, DATA_PATH)
+    if not user:
+        CHAT_REQUESTS.labels("unauthorized").inc()
+        return JSONResponse({"error": err}, status_code=401)
+
+    current_customer_id = user["customer_id"]
+    log_event(f"Authenticated {current_customer_id}", current_customer_id)
+
+    # --- User input ---
+    try:
+        body = await request.json()
+    except ValueError:
+        body = {}
+    user_prompt = body.get("prompt", "")
+    if not user_prompt:
+        CHAT_REQUESTS.labels("bad_request").inc()
+        return JSONResponse({"error": "Missing 'prompt'"}, status_code=400)
+
+    # --- Repeated or canonical prompt: skip the LLM ---
+    cached = cached_intent(user_prompt, current_customer_id)
+    if cached:
+        action, params, out = cached
+        response = await run_in_threadpool(handle_intent, action, params, out, current_customer_id,
+                                           user_prompt, dry_run)
+        CHAT_REQUESTS.labels("ok").inc()
+        return JSONResponse(response)
+
+    log_event(f"Prompt to LLM: {describe_prompt(user_prompt)}", current_customer_id)
+
+    # --- Call LLM (bounded, with deadline, cancelled on client disconnect) ---
+    llm_task = asyncio.create_task(_call_llm(user_prompt, lane))
+    disconnect_task = asyncio.create_task(_wait_for_disconnect(request))
+    try:
+        with stage("llm_call"):
+            done, _ = await asyncio.wait({llm_task, disconnect_task},
+                                         timeout=CHAT_DEADLINE,
+                                         return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        disconnect_task.cancel()
+
+    if llm_task not in done:
+        llm_task.cancel()
+        if disconnect_task in done:
+            CHAT_REQUESTS.labels("client_disconnected").inc()
+            log_event("Client disconnected, LLM call cancelled", current_customer_id)
+            return JSONResponse({"error": "client disconnected"}, status_code=499)
+        CHAT_REQUESTS.labels("llm_error").inc()
+        return JSONResponse({"llm": "[llm-error] deadline exceeded", "executed": False},
+                            status_code=504)
+
+    try:
+        out = llm_task.result()
+        log_event(f"LLM Output: {out}", current_customer_id)
+    except Exception as e:
+        CHAT_REQUESTS.labels("llm_error").inc()
+        return JSONResponse({"llm": f"[llm-error] {e}", "executed": False})
+
+    action, params = extract_intent(out, user_prompt)
+    # Actions touch the store/ledger (fsync), keep them off the event loop
+    response = await run_in_threadpool(handle_intent, action, params, out, current_customer_id,
+                                       user_prompt, dry_run)
+    CHAT_REQUESTS.labels("ok").inc()
+    return JSONResponse(response)
+
+
+app = Starlette(
+    routes=[
+        Route("/health", health),
+        Route("/metrics", metrics),
+        Route("/chat", chat_limited, methods=["POST"]),
+        Route("/eval/chat", eval_chat, methods=["POST"]),
+        Route("/eval/info", eval_info),
+    ],
+    on_startup=[_startup],
+    on_shutdown=[_shutdown],
+)
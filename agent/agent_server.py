@@ -1,27 +1,89 @@
 import json
+import time
 import requests
-from flask import Flask, request, jsonify
+from requests.adapters import HTTPAdapter
+from flask import Flask, Response, request, jsonify, g
 
 from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
 
 
-from config import LLM_URL, DATA_PATH, AUTO_EXECUTE
-from utils import log_event
-from auth import validate_token
-from extractor import extract_action_from_text
-from actions import perform_action
-from actions import validate_action
+from config import (LLM_URL, DATA_PATH, LLM_TIMEOUT, LLM_POOL_SIZE, LLM_STREAM,
+                    RATE_LIMIT_STORAGE, RATE_LIMIT_STRATEGY, CHAT_RATE_LIMIT, DEFAULT_RATE_LIMIT)
+from utils import log_event, new_request_id, request_id_var
+from auth import validate_token, check_eval_token
+from pipeline import (describe_prompt, llm_request, cached_intent, extract_intent, handle_intent,
+                      SYSTEM_PROMPT_ID)
+from store import get_store
+from extractor import ActionStreamParser
+from metrics import stage, render, CHAT_REQUESTS
+from rate_limit import customer_key  # also registers the window:// storage schemes
 
 app = Flask(__name__)
 
+# Keep-alive connections to the LLM proxy, shared by all request threads
+session = requests.Session()
+session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=LLM_POOL_SIZE))
+
+# Load and index the customer data once at startup
+get_store(DATA_PATH)
+
 limiter = Limiter(
-    key_func=lambda: request.headers.get("Authorization", get_remote_address()),
-    default_limits=["60 per minute"],  # Default rate limit
+    key_func=customer_key,
+    default_limits=[DEFAULT_RATE_LIMIT],
+    storage_uri=RATE_LIMIT_STORAGE,
+    strategy=RATE_LIMIT_STRATEGY,
+    # Fall back to per-process counters if the shared storage is unreachable
+    in_memory_fallback_enabled=True,
     app=app
 )
 
 
+def _trace_headers(lane="interactive"):
+    return {"X-Request-ID": request_id_var.get() or "", "X-Priority": lane}
+
+
+@app.before_request
+def bind_request_id():
+    new_request_id(request.headers.get("X-Request-ID"))
+    g.started = time.perf_counter()
+
+
+@app.after_request
+def add_request_id(response):
+    response.headers["X-Request-ID"] = request_id_var.get() or ""
+    if request.path in ("/chat", "/eval/chat"):
+        # Closes the request's timeline for log_profiler.py
+        log_event({"event": "chat_done", "status": response.status_code,
+                   "ms": round((time.perf_counter() - g.started) * 1000, 1)})
+    return response
+
+
+def call_llm(user_prompt, lane="interactive"):
+    """Return the LLM output for `user_prompt`.
+
+    In streaming mode the proxy's NDJSON chunks are scanned as they arrive
+    and the connection is dropped as soon as a complete action object has
+    been seen, which stops generation upstream. `lane` is the proxy
+    scheduler priority ("batch" for evaluation traffic).
+    """
+    payload = llm_request(user_prompt)
+    if not LLM_STREAM:
+        r = session.post(LLM_URL, json=payload, headers=_trace_headers(lane), timeout=LLM_TIMEOUT)
+        return r.json().get("output", "")
+
+    parser, parts = ActionStreamParser(), []
+    with session.post(LLM_URL, json=dict(payload, stream=True), headers=_trace_headers(lane),
+                      timeout=LLM_TIMEOUT, stream=True) as r:
+        for line in r.iter_lines():
+            if not line:
+                continue
+            piece = json.loads(line).get("output", "")
+            parts.append(piece)
+            if parser.feed(piece):
+                break
+    return "".join(parts)
+
+
 @app.route("/health")
 @limiter.limit("6 per minute")
 def health():
@@ -30,126 +92,75 @@ def health():
 @app.route("/metrics")
 @limiter.limit("6 per minute")
 def metrics():
-    return jsonify({"requests_handled": "000000"})
+    body, content_type = render()
+    return Response(body, content_type=content_type)
 
 
 @app.route("/chat", methods=["POST"])
-@limiter.limit("30 per minute")
+@limiter.limit(CHAT_RATE_LIMIT)
 def chat():
+    return handle_chat()
+
+
+# Red-team evaluation: same pipeline, no rate limit, batch lane on the proxy,
+# actions are never executed
+@app.route("/eval/chat", methods=["POST"])
+@limiter.exempt
+def eval_chat():
+    if not check_eval_token(request.headers.get("X-Eval-Token")):
+        return jsonify({"error": "Not found"}), 404
+    return handle_chat(lane="batch", dry_run=True)
+
+
+@app.route("/eval/info")
+@limiter.exempt
+def eval_info():
+    if not check_eval_token(request.headers.get("X-Eval-Token")):
+        return jsonify({"error": "Not found"}), 404
+    return jsonify({"system_prompt_id": SYSTEM_PROMPT_ID})
+
+
+def handle_chat(lane="interactive", dry_run=False):
     # --- Authenticate user ---
     header_token = request.headers.get("Authorization")
-    user, err = validate_token(header_token, DATA_PATH)
+    with stage("auth"):
+        user, err = validate_token(header_token, DATA_PATH)
     if not user:
+        CHAT_REQUESTS.labels("unauthorized").inc()
         return jsonify({"error": err}), 401
 
     current_customer_id = user["customer_id"]
-    log_event(f"Authenticated {current_customer_id}")
+    log_event(f"Authenticated {current_customer_id}", current_customer_id)
 
     # --- User input ---
     user_prompt = request.json.get("prompt", "")
     if not user_prompt:
+        CHAT_REQUESTS.labels("bad_request").inc()
         return jsonify({"error": "Missing 'prompt'"}), 400
 
-    # --- Build system prompt ---
-    system = (
-        "System: You are a secure banking agent.\n"
-        "Respond ONLY with a valid JSON object of the form:\n"
-        "{ \"action\": \"<one of: clarify, get_balance, get_transactions, get_customer_info, transfer, freeze_account >\","
-        "  \"params\": { ... } }\n"
-        "Use these exact parameter patterns:\n"
-        "  - get_balance → {}\n"
-        "  - get_transactions → {\"n\":}\n"
-        "  - get_customer_info → {}\n"
-        "  - transfer → {\"to\":\"CUST###\",\"amount\":}\n"
-        "  - freeze_account → {}\n"
-        "  - clarify → {\"message\":\"Could you please specify what help you need — balance, transfer, or account info?\"}\n"
-        "If you do not understand the user's request or it is unrelated to banking, respond with the 'clarify' action.\n"
-        "Return ONLY the JSON object — no markdown, code fences, or plain text."
-    )
-
-
-    final_prompt = f"{system}\n\nUser: {user_prompt}"
-    log_event(f"Prompt to LLM: {final_prompt}", current_customer_id)
+    # --- Repeated or canonical prompt: skip the LLM ---
+    cached = cached_intent(user_prompt, current_customer_id)
+    if cached:
+        action, params, out = cached
+        CHAT_REQUESTS.labels("ok").inc()
+        return jsonify(handle_intent(action, params, out, current_customer_id, user_prompt,
+                                     dry_run))
+
+    log_event(f"Prompt to LLM: {describe_prompt(user_prompt)}", current_customer_id)
 
     # --- Call LLM ---
     try:
-        r = requests.post(LLM_URL, json={"prompt": final_prompt}, timeout=60)
-        out = r.json().get("output", "")
+        with stage("llm_call"):
+            out = call_llm(user_prompt, lane)
         log_event(f"LLM Output: {out}", current_customer_id)
     except Exception as e:
+        CHAT_REQUESTS.labels("llm_error").inc()
         return jsonify({"llm": f"[llm-error] {e}", "executed": False})
 
-    # --- Extract action ---
-    action, params = extract_action_from_text(out)
-    if not action:
-        return jsonify({
-            "clarification": "I didn't understand your request. "
-                             "Would you like balance, transactions, info, transfer, or freeze account?"
-        })
-
-    # --- Execute action (if allowed) ---
-    executed, result = False, None
-    if action:
-        if action == "clarify":
-            result = params
-            executed = False
-        else:
-            # --- NEW: validate action before executing ---
-            is_valid, reason = validate_action(current_customer_id, action, params)
-            log_event(f"is_valid, reason - {is_valid}, {reason}", "Action Validation: ")
-            if not is_valid:
-                reason = "Invalid action - " + reason
-                result = {"error": reason}
-                executed = False
-            elif AUTO_EXECUTE:
-                result = perform_action(action, params, DATA_PATH, current_customer_id)
-                executed = True
-            
-    # ---- Generate human-friendly message ----
-        user_message = ""
-
-        if action == "clarify":
-            user_message = result.get("message", "Could you please specify what help you need?")
-        elif action == "get_balance" and executed and isinstance(result, dict):
-            bal = result.get("balance")
-            cur = result.get("currency", "USD")
-            if bal is not None:
-                user_message = f"Your current account balance is {bal:.2f} {cur}."
-            else:
-                user_message = "Unable to retrieve your balance."
-        elif action == "get_transactions" and executed:
-            txs = result.get("transactions", [])
-            if txs:
-                user_message = f"Here are your last {len(txs)} transactions."
-            else:
-                user_message = "No transactions found."
-        elif action == "get_customer_info" and executed:
-            user_message = "Here is your account information."
-        elif action == "transfer" and executed:
-            amt = result.get("amount")
-            to = result.get("to")
-            if amt and to:
-                user_message = f"Transfer of ${amt:.2f} to {to} has been completed."
-            else:
-               user_message = f"Transfer could not be completed. Details: {json.dumps(result, ensure_ascii=False)}"
-        elif action == "freeze_account" and executed:
-            user_message = "Your account has been frozen as requested."
-        elif not action:
-            user_message = "I'm not sure what you meant. Could you clarify?"
-        else:
-            user_message = "Action executed."
-
-
-
-    return jsonify({
-        "authenticated_user": current_customer_id,
-        "llm_output": out,
-        "action": action,
-        "params": params,
-        "executed": executed,
-        "action_result": result,
-        "message": user_message
-    })
+    action, params = extract_intent(out, user_prompt)
+    CHAT_REQUESTS.labels("ok").inc()
+    return jsonify(handle_intent(action, params, out, current_customer_id, user_prompt,
+                                 dry_run))
 
 
 if __name__ == "__main__":
@@ -1,5 +1,120 @@
 import base64
-from utils import load_data
+import hashlib
+import hmac
+import threading
+import time
+from collections import OrderedDict
+
+from config import EVAL_TOKEN, AUTH_NEGATIVE_TTL, AUTH_NEGATIVE_CACHE_SIZE
+from store import get_store
+from metrics import register_stats
+
+
+class TokenIndex:
+    """Auth token -> customer map for one customer store.
+
+    Tokens are keyed by their SHA-256 digest, so lookup cost is independent
+    of the number of customers and of how much of a token matches; the
+    stored token is then confirmed with hmac.compare_digest. The map follows
+    the store's `generation`: on a reload only new or changed tokens are
+    re-hashed. Unknown tokens are remembered for `negative_ttl` seconds and
+    rejected without touching the store. With a `.snap` data file the
+    snapshot's own digest index is searched instead of building the map.
+    """
+
+    def __init__(self, store, negative_ttl=5.0, negative_size=4096):
+        self.store = store
+        self.negative_ttl = negative_ttl
+        self.negative_size = negative_size
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.rebuilds = 0
+        self._generation = None
+        self._by_digest = {}    # digest -> (token bytes, customer)
+        self._digests = {}      # token -> digest, reused across rebuilds
+        self._negative = OrderedDict()  # digest -> expires at
+        self._lock = threading.Lock()
+
+    def _sync(self):
+        self.store.refresh()
+        if self.store.generation == self._generation:
+            return
+        with self._lock:
+            generation, customers = self.store.customers()
+            if generation == self._generation:
+                return
+            by_digest, digests = {}, {}
+            for c in customers:
+                token = c.get("auth_token_b64")
+                if not token:
+                    continue
+                digest = self._digests.get(token) or hashlib.sha256(token.encode()).digest()
+                digests[token] = digest
+                by_digest[digest] = (token.encode(), c)
+            self._by_digest, self._digests = by_digest, digests
+            self._negative.clear()
+            self._generation = generation
+            self.rebuilds += 1
+
+    def lookup(self, token):
+        """Customer for `token`, or None."""
+        token = token.encode()
+        digest = hashlib.sha256(token).digest()
+        now = time.monotonic()
+        with self._lock:
+            expires = self._negative.get(digest)
+            if expires is not None:
+                if expires > now:
+                    self.negative_hits += 1
+                    return None
+                del self._negative[digest]
+
+        if self.store.snapshot is not None:
+            # Snapshot data carries its own sorted digest index
+            entry = self.store.by_token_digest(digest)
+        else:
+            self._sync()
+            entry = self._by_digest.get(digest)
+        if entry is not None and hmac.compare_digest(entry[0], token):
+            self.hits += 1
+            return entry[1]
+
+        with self._lock:
+            self.misses += 1
+            if self.negative_ttl > 0:
+                self._negative[digest] = now + self.negative_ttl
+                while len(self._negative) > self.negative_size:
+                    self._negative.popitem(last=False)
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "tokens": len(self._by_digest),
+                "negative_size": len(self._negative),
+                "hits": self.hits,
+                "misses": self.misses,
+                "negative_hits": self.negative_hits,
+                "rebuilds": self.rebuilds,
+            }
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_token_index(data_path):
+    """Process-wide TokenIndex for the store at `data_path`."""
+    with _indexes_lock:
+        index = _indexes.get(data_path)
+        if index is None:
+            index = TokenIndex(get_store(data_path), AUTH_NEGATIVE_TTL, AUTH_NEGATIVE_CACHE_SIZE)
+            _indexes[data_path] = index
+            register_stats("agent_auth", index.stats,
+                           counters=("hits", "misses", "negative_hits", "rebuilds"))
+        return index
+
 
 def validate_token(header_token, data_path):
     """
@@ -14,10 +129,13 @@ def validate_token(header_token, data_path):
         return None, "Invalid Authorization format"
 
     token = parts[1].strip()
-    data = load_data(data_path)
-
-    for c in data["customers"]:
-        if c.get("auth_token_b64") == token:
-            return c, None
+    c = get_token_index(data_path).lookup(token)
+    if c:
+        return c, None
 
     return None, "Invalid or unknown token"
+
+
+def check_eval_token(header_value):
+    """True if the X-Eval-Token header matches EVAL_TOKEN (route disabled when unset)."""
+    return bool(EVAL_TOKEN) and hmac.compare_digest((header_value or "").encode(), EVAL_TOKEN.encode())
@@ -0,0 +1,110 @@
+# bench_extractor.py
+"""Micro-benchmark for extractor.extract_action_from_text.
+
+Replays the "LLM Output:" messages found in the agent log (legacy
+"date | LEVEL | msg" lines with multi-line messages, or JSON lines) and a
+set of adversarial outputs, and reports per-call latency and how the cost
+grows with input size (it should grow linearly).
+
+    python bench_extractor.py [--log /app/logs/agent.log] [--repeat 20]
+"""
+import argparse
+import json
+import re
+import time
+
+import extractor
+
+LEGACY_RECORD = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2} \| \w+ \| (?:\[\w+\] )?(.*)$")
+PREFIX = "LLM Output: "
+
+
+def iter_messages(path):
+    """Log messages, joining legacy multi-line messages; JSON lines use "msg"."""
+    current = None
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line.startswith("{"):
+                try:
+                    msg = json.loads(line).get("msg")
+                except ValueError:
+                    msg = None
+                if isinstance(msg, str):
+                    if current is not None:
+                        yield current
+                    current = None
+                    yield msg
+                    continue
+            m = LEGACY_RECORD.match(line)
+            if m:
+                if current is not None:
+                    yield current
+                current = m.group(1)
+            elif current is not None:
+                current += "\n" + line
+    if current is not None:
+        yield current
+
+
+def load_outputs(path):
+    return [m[len(PREFIX):] for m in iter_messages(path) if m.startswith(PREFIX)]
+
+
+def adversarial(size):
+    """Outputs of about `size` characters built to stress a backtracking extractor."""
+    def fill(unit):
+        return (unit * (size // len(unit) + 1))[:size]
+    return {
+        "open_braces": fill("{"),
+        "repeated_action_keys": fill('{"action"'),
+        "unterminated_string": '{"a": "' + fill("\\\\"),
+        "prose_then_json": fill("x") + '{"action": "get_balance", "params": {}}',
+        "many_small_objects": fill('{"action": "x"} '),
+        "deep_nesting": '{"action": "x", "a": ' + fill("["),
+    }
+
+
+def timed(fn, arg, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(arg)
+        samples.append(time.perf_counter() - t0)
+    return min(samples)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))] if values else 0.0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--log", default="/app/logs/agent.log")
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+    fn = extractor.extract_action_from_text
+    print(f"json backend: {extractor._loads.__module__}")
+
+    try:
+        outputs = load_outputs(args.log)
+    except OSError as e:
+        print(f"no log outputs ({e})")
+        outputs = []
+    if outputs:
+        times = [timed(fn, o, args.repeat) * 1e6 for o in outputs]
+        total = sum(len(o) for o in outputs)
+        print(f"\n{len(outputs)} logged outputs, {total / 1024:.0f} KiB")
+        print(f"p50 {percentile(times, 50):.1f} us  p99 {percentile(times, 99):.1f} us  "
+              f"max {max(times):.1f} us  ({total / sum(times):.1f} MB/s)")
+
+    print(f"\n{'adversarial input':<24} {'1 KiB us':>10} {'8 KiB us':>10} {'64 KiB us':>10}")
+    for name in adversarial(16):
+        row = [timed(fn, adversarial(size)[name], max(1, args.repeat // 4)) * 1e6
+               for size in (1024, 8192, 65536)]
+        print(f"{name:<24} {row[0]:>10.0f} {row[1]:>10.0f} {row[2]:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# bench_snapshot.py
+"""Cold start and memory of the customer store: JSON file vs mmapped .snap.
+
+For each size a synthetic data set (same schema as data/) is written in both
+formats; then a fresh process per format loads the store, authenticates one
+customer and reads their transactions. Reported: time to first answer,
+resident memory split into private (anon) and file-backed pages (the latter
+are shared between workers mapping the same snapshot), and peak RSS. The
+process then makes --transfers transfers and times folding them into a new
+snapshot, the pause compaction adds to a transfer (transfers in every worker
+wait on the ledger append lock meanwhile).
+
+    python bench_snapshot.py [--sizes 10000,100000,1000000] [--dir /tmp/snapbench]
+                             [--transfers 1000]
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+
+def synthetic_customers(n, seed=7):
+    rng = random.Random(seed)
+    for i in range(n):
+        cid = f"CUST{i:07d}"
+        yield {
+            "customer_id": cid,
+            "auth_token_b64": f"dG9rZW4t{i:09d}",
+            "name": f"Demo Customer {i}",
+            "dob": f"19{rng.randint(50, 99)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}",
+            "ssn_simulated": f"SIM-SSN-{rng.randint(100, 999)}-{rng.randint(10, 99)}-{i % 10000:04d}",
+            "account": {"account_id": f"ACCT{i:08d}", "routing_number": "RT200000001",
+                        "account_type": rng.choice(("checking", "savings")),
+                        "balance": round(rng.uniform(0, 20000), 2), "currency": "USD"},
+            "contact": {"phone": f"+1-555-{i % 10000:04d}", "email": f"user{i}@demobank.test",
+                        "address": f"{i} Demo St, City{i % 50}, ST"},
+            "transactions": [
+                {"tx_id": f"TX{i:07d}{k}", "date": f"2025-{k + 1:02d}-{k + 1:02d}",
+                 "amount": rng.randint(1, 500), "description": rng.choice(("ATM", "POS", "CREDIT")),
+                 "counterparty": f"DemoEntity{rng.randint(1, 20)}"}
+                for k in range(4)
+            ],
+        }
+
+
+def write_json(path, n):
+    """Same layout save_data produces (indent=2), streamed customer by customer."""
+    with open(path, "w") as f:
+        f.write('{\n  "ledger_seq": 0,\n  "customers": [')
+        for i, c in enumerate(synthetic_customers(n)):
+            f.write(("," if i else "") + "\n    " + json.dumps(c, indent=2).replace("\n", "\n    "))
+        f.write("\n  ]\n}\n")
+
+
+def rss_kib():
+    """(anon, file-backed, peak) resident KiB of this process.
+
+    VmHWM rather than ru_maxrss: the latter survives exec and would report
+    the parent's peak."""
+    fields = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("RssAnon", "RssFile", "VmHWM"):
+                fields[key] = int(value.split()[0])
+    return fields.get("RssAnon", 0), fields.get("RssFile", 0), fields.get("VmHWM", 0)
+
+
+def child(path, n, transfers):
+    started = time.perf_counter()
+    from auth import validate_token
+    from store import get_store
+    rng = random.Random(1)
+    i = rng.randrange(n)
+    user, err = validate_token(f"Basic dG9rZW4t{i:09d}", path)
+    assert user and user["customer_id"] == f"CUST{i:07d}", err
+    store = get_store(path)
+    store.recent_transactions(user["customer_id"], 3)
+    elapsed = time.perf_counter() - started
+    anon, file_backed, peak = rss_kib()
+
+    for _ in range(transfers):
+        src, dst = rng.sample(range(n), 2)
+        store.transfer(f"CUST{src:07d}", f"CUST{dst:07d}", 1)
+    with store.lock, store.ledger.append_lock():
+        t0 = time.perf_counter()
+        store._compact()
+        compact = time.perf_counter() - t0
+    print(json.dumps({"seconds": elapsed, "anon_kib": anon, "file_kib": file_backed,
+                      "peak_kib": peak, "compact_seconds": compact}))
+
+
+def measure(path, n, transfers, workdir):
+    # Compaction is triggered explicitly, after the transfers
+    env = dict(os.environ, LLM_URL="http://unused", DATA_PATH=path,
+               LOG_FILE=os.path.join(workdir, "bench.log"), LEDGER_COMPACT_EVERY=str(10**9))
+    out = subprocess.run([sys.executable, __file__, "--child", path, "--n", str(n),
+                          "--transfers", str(transfers)],
+                         env=env, capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.abspath(__file__)))
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sizes", default="10000,100000,1000000")
+    ap.add_argument("--dir", default="/tmp/snapbench")
+    ap.add_argument("--transfers", type=int, default=1000,
+                    help="ledger entries folded by the timed compaction")
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    ap.add_argument("--n", type=int, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        child(args.child, args.n, args.transfers)
+        return
+
+    from snapshot import write_snapshot
+    os.makedirs(args.dir, exist_ok=True)
+    print(f"{'customers':>10} {'format':>6} {'file MiB':>9} {'start s':>8} "
+          f"{'anon MiB':>9} {'file-backed MiB':>16} {'peak MiB':>9} {'compact s':>10}")
+    for n in (int(s) for s in args.sizes.split(",")):
+        json_path = os.path.join(args.dir, f"customers_{n}.json")
+        snap_path = os.path.join(args.dir, f"customers_{n}.snap")
+        if not os.path.exists(json_path):
+            write_json(json_path, n)
+        if not os.path.exists(snap_path):
+            write_snapshot(snap_path, {"ledger_seq": 0, "customers": synthetic_customers(n)})
+        for fmt, path in (("json", json_path), ("snap", snap_path)):
+            for suffix in (".ledger", ".lock"):
+                if os.path.exists(path + suffix):
+                    os.unlink(path + suffix)
+            size = os.path.getsize(path)
+            r = measure(path, n, args.transfers, args.dir)
+            print(f"{n:>10} {fmt:>6} {size / 2**20:>9.1f} {r['seconds']:>8.3f} "
+                  f"{r['anon_kib'] / 1024:>9.1f} {r['file_kib'] / 1024:>16.1f} "
+                  f"{r['peak_kib'] / 1024:>9.1f} {r['compact_seconds']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
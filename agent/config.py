@@ -13,5 +13,58 @@ DATA_PATH = os.environ["DATA_PATH"]
 AUTO_EXECUTE = os.environ.get("AUTO_EXECUTE", "true").lower() == "true"
 RED_TEAM_MODE = os.environ.get("RED_TEAM_MODE", "false").lower() == "true"
 
-# Risk tuning (future use)
+# Risk tuning: transfers with fraud score (probability x 100) >= threshold are rejected
 RISK_THRESHOLD = int(os.environ.get("RISK_THRESHOLD", "40"))
+
+# Fraud service used to score transfers (empty disables scoring)
+FRAUD_URL = os.environ.get("FRAUD_URL", "")
+FRAUD_TIMEOUT_MS = int(os.environ.get("FRAUD_TIMEOUT_MS", "150"))
+# "open": allow transfers when the service is slow/down, "closed": reject them
+FRAUD_FAIL_MODE = os.environ.get("FRAUD_FAIL_MODE", "open").lower()
+FRAUD_CACHE_TTL = float(os.environ.get("FRAUD_CACHE_TTL", "60"))
+
+# Ledger: number of journal entries before they are folded into the snapshot
+LEDGER_COMPACT_EVERY = int(os.environ.get("LEDGER_COMPACT_EVERY", "1000"))
+
+# LLM proxy request timeout (seconds)
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", "60"))
+# Keep-alive connections kept open to the LLM proxy
+LLM_POOL_SIZE = int(os.environ.get("LLM_POOL_SIZE", "64"))
+
+# Async serving mode (agent_asgi.py)
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "256"))
+CHAT_DEADLINE = float(os.environ.get("CHAT_DEADLINE", "65"))
+
+# Intent cache in front of the LLM (size 0 disables it)
+INTENT_CACHE_SIZE = int(os.environ.get("INTENT_CACHE_SIZE", "1024"))
+INTENT_CACHE_TTL = float(os.environ.get("INTENT_CACHE_TTL", "300"))
+
+# Pre-LLM fast path for read-only intents: off | shadow (compare only) | on
+FAST_PATH_MODE = os.environ.get("FAST_PATH_MODE", "on").lower()
+FAST_PATH_THRESHOLD = float(os.environ.get("FAST_PATH_THRESHOLD", "0.9"))
+# What to do below the threshold: "llm" (default) or "clarify" (no LLM at all)
+FAST_PATH_FALLBACK = os.environ.get("FAST_PATH_FALLBACK", "llm").lower()
+
+# Guardrail stage (param schemas, prompt risk score, intent check) before validation
+GUARDRAILS = os.environ.get("GUARDRAILS", "false").lower() == "true"
+# Prompts whose risk score reaches this are refused (see guardrails.RISK_RULES)
+GUARDRAILS_RISK_THRESHOLD = int(os.environ.get("GUARDRAILS_RISK_THRESHOLD", "50"))
+
+# Rate limiting: limits storage URI. memory:// is per worker process; use
+# window+unix:///path.sock or window://host:port (rate_limit_server.py) to share
+# the counters between workers and hosts
+RATE_LIMIT_STORAGE = os.environ.get("RATE_LIMIT_STORAGE", "memory://")
+RATE_LIMIT_STRATEGY = os.environ.get("RATE_LIMIT_STRATEGY", "sliding-window-counter")
+# Per-customer quotas (keyed on the customer ID, or client address when unauthenticated)
+CHAT_RATE_LIMIT = os.environ.get("CHAT_RATE_LIMIT", "30 per minute")
+DEFAULT_RATE_LIMIT = os.environ.get("DEFAULT_RATE_LIMIT", "60 per minute")
+
+# Unknown auth tokens are rejected from a cache for this many seconds (0 disables it)
+AUTH_NEGATIVE_TTL = float(os.environ.get("AUTH_NEGATIVE_TTL", "5"))
+AUTH_NEGATIVE_CACHE_SIZE = int(os.environ.get("AUTH_NEGATIVE_CACHE_SIZE", "4096"))
+
+# Shared secret for the /eval/chat red-team route (X-Eval-Token); empty disables it
+EVAL_TOKEN = os.environ.get("EVAL_TOKEN", "")
+
+# Stream LLM output and stop as soon as a complete action object is parsed
+LLM_STREAM = os.environ.get("LLM_STREAM", "false").lower() == "true"
@@ -1,6 +1,13 @@
 import json
 import re
 from utils import log_event
+from metrics import EXTRACTOR_PATH
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
 
 ALLOWED_ACTIONS = {
     "get_balance",
@@ -10,72 +17,188 @@ ALLOWED_ACTIONS = {
     "freeze_account"
 }
 
+CLARIFY_MESSAGE = "Could you please specify what help you need — balance, transfer, or account info?"
+
+# Structural characters for the brace scanner; everything else is skipped by the regex engine
+_TOKENS = re.compile(r'[{}"\\]')
+_FENCE = re.compile(r"```(?:json)?")
+# Keyword fallback: one pass collects every keyword, priority is applied afterwards
+_KEYWORDS = re.compile(r"clarify|balance|transaction|info|detail|transfer|freeze", re.IGNORECASE)
+_KEYWORD_ORDER = (
+    ("clarify", "clarify"),
+    ("balance", "get_balance"),
+    ("transaction", "get_transactions"),
+    ("info", "get_customer_info"),
+    ("detail", "get_customer_info"),
+    ("transfer", "transfer"),
+    ("freeze", "freeze_account"),
+)
+_AMOUNT = re.compile(r"\$?(\d+(?:\.\d+)?)")
+_CUSTOMER_ID = re.compile(r"cust\d{3}", re.IGNORECASE)
+
+
+class BraceScanner:
+    """Finds balanced top-level {...} spans in one left-to-right pass.
+
+    Only structural characters are visited (the regex engine skips the rest)
+    and braces inside JSON strings are ignored. State carries over between
+    `scan()` calls, so streamed text can be fed chunk by chunk. Cost is
+    linear in the input: nothing is ever re-scanned.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.start = None
+        self._in_str = False
+        self._skip = -1  # absolute position of an escaped character
+
+    def scan(self, text, base=0):
+        """Yields (start, end) absolute offsets of each object closed in `text`."""
+        for m in _TOKENS.finditer(text):
+            pos = base + m.start()
+            if pos == self._skip:
+                continue
+            ch = m.group()
+            if self.depth == 0:
+                if ch == "{":
+                    self.depth = 1
+                    self.start = pos
+                continue
+            if self._in_str:
+                if ch == "\\":
+                    self._skip = pos + 1
+                elif ch == '"':
+                    self._in_str = False
+            elif ch == '"':
+                self._in_str = True
+            elif ch == "{":
+                self.depth += 1
+            elif ch == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    yield self.start, pos + 1
+
+
+def _parse(text):
+    try:
+        return _loads(text)
+    except (ValueError, RecursionError):
+        # The stdlib parser recurses per nesting level; orjson raises ValueError
+        return None
+
+
 def extract_action_from_text(text):
     """Extracts the intended action and parameters from LLM output.
     Safely handles clarify responses and prevents false action detection.
     """
-    clean = text.replace("```json", "").replace("```", "").strip()
-
     # --- Case 1: Direct JSON ---
-    try:
-        obj = json.loads(clean)
-        if "action" in obj:
-            act = str(obj["action"]).strip().lower()
-            params = obj.get("params", {})
-
-            # Explicitly handle clarify
-            if act == "clarify":
-                log_event("Detected clarify action (explicit JSON).")
-                return "clarify", params
-
-            if act in ALLOWED_ACTIONS:
-                return act, params
-            else:
-                log_event(f"Rejected unknown action: {act}")
-                return None, {}
-    except Exception:
-        pass
+    clean = text.strip()
+    if "```" in clean:
+        clean = _FENCE.sub("", clean).strip()
+    obj = _parse(clean) if clean.startswith("{") else None
+    if isinstance(obj, dict) and "action" in obj:
+        act = str(obj["action"]).strip().lower()
+        params = obj.get("params", {})
+
+        EXTRACTOR_PATH.labels("direct_json").inc()
+        # Explicitly handle clarify
+        if act == "clarify":
+            log_event("Detected clarify action (explicit JSON).")
+            return "clarify", params
+
+        if act in ALLOWED_ACTIONS:
+            return act, params
+        else:
+            log_event(f"Rejected unknown action: {act}")
+            return None, {}
 
     # --- Case 2: Embedded JSON in text ---
-    m = re.search(r"\{.*\"action\".*\}", clean)
-    if m:
-        try:
-            j = json.loads(m.group(0))
-            act = str(j.get("action", "")).strip().lower()
+    # Every balanced object is checked; several objects asking for different
+    # actions are ambiguous and left to the keyword fallback.
+    found = None
+    for start, end in BraceScanner().scan(text):
+        span = text[start:end]
+        if '"action"' not in span:
+            continue
+        j = _parse(span)
+        if not isinstance(j, dict):
+            continue
+        act = str(j.get("action", "")).strip().lower()
+        if act != "clarify" and act not in ALLOWED_ACTIONS:
+            continue
+        if found is None:
             params = j.get("params", {})
+            found = act, params if isinstance(params, dict) else {}
+        elif found[0] != act:
+            log_event("Ambiguous output: several embedded actions.")
+            found = None
+            break
 
-            if act == "clarify":
-                log_event("Detected clarify action (embedded JSON).")
-                return "clarify", params
-
-            if act in ALLOWED_ACTIONS:
-                return act, params
-        except Exception:
-            pass
+    if found:
+        act, params = found
+        EXTRACTOR_PATH.labels("embedded_json").inc()
+        if act == "clarify":
+            log_event("Detected clarify action (embedded JSON).")
+        return act, params
 
     # --- Case 3: Keyword fallback (only if no clarify) ---
-    t = text.lower()
-
-    # Prevent misclassification of clarification messages
-    if '"clarify"' in t or 'clarify' in t:
-        return "clarify", {
-            "message": "Could you please specify what help you need — balance, transfer, or account info?"
-        }
-
-    # --- Heuristic fallback detection ---
-    if "balance" in t:
-        return "get_balance", {}
-    if "transaction" in t:
-        return "get_transactions", {"n": 3}
-    if "info" in t or "detail" in t:
-        return "get_customer_info", {}
-    if "transfer" in t:
-        amt_match = re.search(r"\$?(\d+(?:\.\d+)?)", t)
-        amount = float(amt_match.group(1)) if amt_match else 0.0
-        dest = re.search(r"cust\d{3}", t)
-        to = dest.group(0).upper() if dest else "UNKNOWN"
-        return "transfer", {"to": to, "amount": amount}
-    if "freeze" in t:
-        return "freeze_account", {}
+    action, params = _keyword_fallback(text)
+    EXTRACTOR_PATH.labels("keyword" if action else "none").inc()
+    return action, params
+
+
+def _keyword_fallback(text):
+    """Keyword heuristics over the LLM output (case-insensitive)."""
+    found = {m.group().lower() for m in _KEYWORDS.finditer(text)}
+    for keyword, action in _KEYWORD_ORDER:
+        if keyword not in found:
+            continue
+        # Prevent misclassification of clarification messages
+        if action == "clarify":
+            return "clarify", {"message": CLARIFY_MESSAGE}
+        if action == "get_transactions":
+            return action, {"n": 3}
+        if action == "transfer":
+            amt_match = _AMOUNT.search(text)
+            amount = float(amt_match.group(1)) if amt_match else 0.0
+            dest = _CUSTOMER_ID.search(text)
+            to = dest.group(0).upper() if dest else "UNKNOWN"
+            return "transfer", {"to": to, "amount": amount}
+        return action, {}
 
     return None, {}
+
+
+class ActionStreamParser:
+    """Incremental scanner for streamed LLM output.
+
+    Feed text chunks as they arrive; `feed()` returns the first complete,
+    top-level JSON object containing an "action" key, or None if more input
+    is needed. Scanner state is kept between chunks, so every character is
+    scanned once no matter how the output is split; only the text of the
+    currently open object is buffered.
+    """
+
+    def __init__(self):
+        self._scanner = BraceScanner()
+        self._buf = ""
+        self._buf_start = 0  # absolute offset of _buf[0]
+        self._pos = 0
+        self.result = None
+
+    def feed(self, chunk):
+        if self.result is not None:
+            return self.result
+        base = self._pos
+        self._pos += len(chunk)
+        self._buf += chunk
+        for start, end in self._scanner.scan(chunk, base):
+            obj = _parse(self._buf[start - self._buf_start:end - self._buf_start])
+            if isinstance(obj, dict) and "action" in obj:
+                self.result = obj
+                return obj
+        # Drop text that can no longer be part of an object
+        keep = self._scanner.start if self._scanner.depth else self._pos
+        self._buf = self._buf[keep - self._buf_start:]
+        self._buf_start = keep
+        return None
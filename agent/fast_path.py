@@ -0,0 +1,112 @@
+import re
+import threading
+from collections import namedtuple
+
+from intent_cache import normalize_prompt
+
+Guess = namedtuple("Guess", ["action", "params", "confidence"])
+
+_NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}
+_N = r"(?:\d{1,3}|" + "|".join(_NUMBER_WORDS) + r")"
+
+_LEAD = r"(?:(?:please |can you |could you )?(?:show(?: me)?|get|give me|tell me|check|list|display|what(?:'s| is| are)) )?"
+_TAIL = r"(?: please)?"
+
+# One compiled alternation; the named group that matched is the intent.
+# Templates are anchored (fullmatch), so anything extra in the prompt falls
+# through to the LLM.
+_TEMPLATES = re.compile(
+    _LEAD + r"(?:"
+    r"(?P<get_balance>(?:my )?(?:current |account |available )*balance"
+    r"|how much (?:money )?(?:do i have|is in my account))"
+    r"|(?P<get_transactions>(?:my )?(?:(?:last|latest|recent|most recent) )?(?P<n>" + _N + r") ?"
+    r"(?:recent |latest )?(?:transactions?|txns?)"
+    r"|(?:my )?(?:last|latest|recent|most recent) (?:transactions?|txns?)"
+    r"|my (?:transactions?|txns?))"
+    r"|(?P<get_customer_info>(?:my )?(?:account|customer|profile) (?:info|information|details))"
+    r")" + _TAIL
+)
+
+# Loose keyword match, used for a lower-confidence guess (shadow stats only
+# unless the threshold is lowered).
+_KEYWORDS = re.compile(r"\b(?:(?P<get_balance>balance)|(?P<get_transactions>transactions?)"
+                       r"|(?P<get_customer_info>info|details))\b")
+_RISKY = re.compile(r"\b(?:transfer|send|pay|freeze|ignore|system|instruction|prompt|reveal|ssn"
+                    r"|debug|admin|override|execute|print|other|customer \w*\d|cust\d)")
+
+
+class FastPathClassifier:
+    """Deterministic pre-LLM classifier for common read-only intents.
+
+    `classify()` returns a Guess with confidence 1.0 for a full template
+    match, 0.6 for a lone keyword in a short, benign prompt, else None.
+    Only guesses at or above `threshold` are served without the LLM.
+    """
+
+    def __init__(self, threshold=0.9, max_words=8):
+        self.threshold = threshold
+        self.max_words = max_words
+        self.seen = 0
+        self.caught = 0
+        self.compared = 0
+        self.agreed = 0
+        self._lock = threading.Lock()
+
+    def classify(self, prompt):
+        text = normalize_prompt(prompt)
+        m = _TEMPLATES.fullmatch(text)
+        if m:
+            action = m.lastgroup if m.lastgroup != "n" else "get_transactions"
+            return Guess(action, self._params(action, m), 1.0)
+
+        if len(text.split()) > self.max_words or _RISKY.search(text):
+            return None
+        found = {k.lastgroup for k in _KEYWORDS.finditer(text)}
+        if len(found) == 1:
+            action = found.pop()
+            return Guess(action, {"n": 3} if action == "get_transactions" else {}, 0.6)
+        return None
+
+    @staticmethod
+    def _params(action, m):
+        if action != "get_transactions":
+            return {}
+        n = m.group("n")
+        if not n:
+            return {"n": 3}
+        return {"n": _NUMBER_WORDS.get(n) or int(n)}
+
+    def route(self, prompt):
+        """Classify and count; returns the Guess if it can skip the LLM."""
+        guess = self.classify(prompt)
+        accepted = guess is not None and guess.confidence >= self.threshold
+        with self._lock:
+            self.seen += 1
+            if accepted:
+                self.caught += 1
+        return guess if accepted else None
+
+    def record_agreement(self, prompt, llm_action, llm_params):
+        """Compare the fast-path guess with what the LLM decided."""
+        guess = self.classify(prompt)
+        if guess is None:
+            return
+        with self._lock:
+            self.compared += 1
+            if guess.action == llm_action and (
+                    guess.action != "get_transactions"
+                    or str(guess.params.get("n")) == str((llm_params or {}).get("n"))):
+                self.agreed += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "seen": self.seen,
+                "caught": self.caught,
+                "compared_with_llm": self.compared,
+                "agreed_with_llm": self.agreed,
+                "agreement_ratio": round(self.agreed / self.compared, 4) if self.compared else 0.0,
+            }
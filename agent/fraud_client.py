@@ -0,0 +1,160 @@
+import math
+import threading
+import time
+
+import requests
+
+from utils import log_event
+
+N_FEATURES = 5
+
+
+class _History:
+    """Running aggregates over one customer's transactions (Welford)."""
+
+    __slots__ = ("owner", "seen", "n_out", "mean", "m2", "counterparties",
+                 "last_date", "out_on_last_date")
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.seen = 0
+        self.n_out = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.counterparties = set()
+        self.last_date = None
+        self.out_on_last_date = 0
+
+    def observe(self, tx):
+        amount = float(tx.get("amount", 0) or 0)
+        date = tx.get("date")
+        desc = tx.get("description", "")
+        if desc.startswith("Transfer to "):
+            self.counterparties.add(desc[len("Transfer to "):])
+        elif tx.get("counterparty"):
+            self.counterparties.add(tx["counterparty"])
+        if amount < 0:
+            self.n_out += 1
+            x = -amount
+            delta = x - self.mean
+            self.mean += delta / self.n_out
+            self.m2 += delta * (x - self.mean)
+        if date and (self.last_date is None or date >= self.last_date):
+            if date != self.last_date:
+                self.last_date, self.out_on_last_date = date, 0
+            if amount < 0:
+                self.out_on_last_date += 1
+        self.seen += 1
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.n_out - 1)) if self.n_out > 1 else 0.0
+
+
+class FeatureStore:
+    """Per-customer history features, maintained incrementally.
+
+    Transactions are only ever appended, so each call folds in just the
+    entries added since the last call. If the customer record was replaced
+    (store reload / compaction) the aggregates are rebuilt once.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._history = {}
+
+    def _history_for(self, customer):
+        txs = customer.get("transactions", [])
+        h = self._history.get(customer["customer_id"])
+        if h is None or h.owner is not customer or h.seen > len(txs):
+            h = self._history[customer["customer_id"]] = _History(customer)
+        for tx in txs[h.seen:]:
+            h.observe(tx)
+        return h
+
+    def features(self, customer, dst_id, amount):
+        """Feature vector for a transfer of `amount` from `customer` to `dst_id`:
+        [amount z-score vs. past outgoing amounts, share of balance moved x2,
+         new counterparty, outgoing transfers already made today / 5,
+         days since the last transaction / 30]
+        """
+        with self._lock:
+            h = self._history_for(customer)
+            balance = float(customer["account"]["balance"])
+            z = (amount - h.mean) / max(h.std, 1.0) if h.n_out else 0.0
+            today = time.strftime("%Y-%m-%d")
+            velocity = h.out_on_last_date if h.last_date == today else 0
+            if h.last_date:
+                idle = (time.mktime(time.strptime(today, "%Y-%m-%d"))
+                        - time.mktime(time.strptime(h.last_date, "%Y-%m-%d"))) / 86400
+            else:
+                idle = 30.0
+            return [
+                max(-5.0, min(5.0, z)),
+                2.0 * amount / max(balance, 1.0),
+                0.0 if dst_id in h.counterparties else 1.0,
+                velocity / 5.0,
+                min(max(idle, 0.0), 30.0) / 30.0,
+            ]
+
+
+class FraudScorer:
+    """Scores transfers against the fraud service within a latency budget.
+
+    Recent scores are cached for `cache_ttl` seconds. When the service is
+    slow or down the transfer is allowed (fail_mode "open") or rejected
+    (fail_mode "closed").
+    """
+
+    def __init__(self, url, timeout_ms=150, fail_mode="open", threshold=40, cache_ttl=60):
+        self.url = url
+        self.timeout = timeout_ms / 1000
+        self.fail_mode = fail_mode
+        self.threshold = threshold
+        self.cache_ttl = cache_ttl
+        self.features = FeatureStore()
+        self._session = requests.Session()
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.url)
+
+    def _cached(self, key):
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit and hit[0] > time.monotonic():
+                return hit[1]
+            return None
+
+    def _remember(self, key, prob):
+        with self._lock:
+            now = time.monotonic()
+            if len(self._cache) > 10000:
+                self._cache = {k: v for k, v in self._cache.items() if v[0] > now}
+            self._cache[key] = (now + self.cache_ttl, prob)
+
+    def check_transfer(self, customer, dst_id, amount):
+        """Returns (is_allowed, reason)."""
+        x = self.features.features(customer, dst_id, amount)
+        key = (customer["customer_id"], tuple(round(v, 4) for v in x))
+        prob = self._cached(key)
+        if prob is None:
+            try:
+                r = self._session.post(self.url, json={"features": x}, timeout=self.timeout)
+                r.raise_for_status()
+                prob = float(r.json()["fraud_prob"])
+            except Exception as e:
+                log_event(f"Fraud scoring unavailable ({e}); failing {self.fail_mode}",
+                          customer["customer_id"])
+                if self.fail_mode == "closed":
+                    return False, "Fraud check unavailable, transfer blocked."
+                return True, None
+            self._remember(key, prob)
+
+        score = round(prob * 100)
+        log_event(f"Fraud score {score} for transfer to {dst_id} ({amount})", customer["customer_id"])
+        if score >= self.threshold:
+            return False, f"Transfer flagged as high risk (score {score})."
+        return True, None
@@ -0,0 +1,127 @@
+import re
+
+from extractor import ALLOWED_ACTIONS
+
+try:
+    import fastjsonschema
+
+    def _compile(schema):
+        validate = fastjsonschema.compile(schema)
+
+        def check(obj):
+            try:
+                validate(obj)
+                return None
+            except fastjsonschema.JsonSchemaException as e:
+                return e.message
+        return check
+except ImportError:
+    from jsonschema import Draft7Validator
+
+    def _compile(schema):
+        validator = Draft7Validator(schema)
+
+        def check(obj):
+            error = next(validator.iter_errors(obj), None)
+            return error.message if error else None
+        return check
+
+# Guardrail stage run on every extracted action before validation/execution.
+# All validators and patterns are compiled once at import.
+
+_CUSTOMER_ID = {"type": "string", "pattern": "^CUST[0-9]{3}$"}
+_AMOUNT = {"anyOf": [{"type": "number", "exclusiveMinimum": 0},
+                     {"type": "string", "pattern": r"^\$?[0-9]+(\.[0-9]+)?$"}]}
+_DATE = {"type": "string", "pattern": "^[0-9]{4}-[0-9]{2}-[0-9]{2}$"}
+_COUNT = {"anyOf": [{"type": "integer", "minimum": 1, "maximum": 100},
+                    {"type": "string", "pattern": "^[0-9]{1,3}$"}]}
+
+
+def _params(properties=None, required=()):
+    # customer_id is tolerated everywhere (older prompts asked for it)
+    props = {"customer_id": _CUSTOMER_ID}
+    props.update(properties or {})
+    return {"type": "object", "properties": props, "required": list(required),
+            "additionalProperties": False}
+
+
+PARAM_SCHEMAS = {
+    "get_balance": _params(),
+    "get_transactions": _params({"n": _COUNT, "cursor": {"type": "string"},
+                                 "since": _DATE, "until": _DATE,
+                                 "counterparty": {"type": "string"}}),
+    "get_customer_info": _params(),
+    "transfer": _params({"to": _CUSTOMER_ID, "from": _CUSTOMER_ID, "amount": _AMOUNT},
+                        required=("to", "amount")),
+    "freeze_account": _params(),
+    "clarify": {"type": "object", "properties": {"message": {"type": "string"}}},
+}
+assert set(PARAM_SCHEMAS) == ALLOWED_ACTIONS | {"clarify"}
+
+_PARAM_VALIDATORS = {action: _compile(schema) for action, schema in PARAM_SCHEMAS.items()}
+
+# name -> (phrases, score, reason). All phrases are matched as whole words by
+# one combined pattern; a plain substring test on the lower-cased prompt
+# skips the regex for the (common) prompts that contain none of them.
+RISK_RULES = {
+    "override": (("ignore", "disregard all", "disregard previous", "jailbreak", "developer mode"),
+                 40, "System override attempt"),
+    "pii": (("ssn", "social security"), 50, "Possible PII access attempt"),
+    "execute": (("execute", "run:", "/etc/passwd", "rm -rf"), 20, "Execution-style language"),
+    "extraction": (("system prompt", "your instructions", "your rules"), 30,
+                   "Prompt extraction attempt"),
+}
+_RISK_PHRASES = tuple(p for phrases, _, _ in RISK_RULES.values() for p in phrases)
+_RISK = re.compile("|".join(
+    f"(?P<{name}>" + "|".join(rf"(?<!\w){re.escape(p)}(?!\w)" for p in phrases) + ")"
+    for name, (phrases, _, _) in RISK_RULES.items()))
+
+# Words in the prompt that pin down which action is acceptable
+_INTENT = re.compile(r"(?P<balance>\bbalance\b)|(?P<transfer>\btransfer)")
+_INTENT_ACTION = {"balance": "get_balance", "transfer": "transfer"}
+
+
+def validate_params(action, params):
+    """Schema check of the action's params; returns an error message or None."""
+    check = _PARAM_VALIDATORS.get(action)
+    if check is None:
+        return f"unknown action '{action}'"
+    return check(params)
+
+
+def risk_score(text):
+    """(score, reasons) from the risk phrases, each rule counted once."""
+    text = text.lower()
+    if not any(p in text for p in _RISK_PHRASES):
+        return 0, []
+    score, reasons = 0, []
+    for name in {m.lastgroup for m in _RISK.finditer(text)}:
+        _, points, reason = RISK_RULES[name]
+        score += points
+        reasons.append(reason)
+    return score, reasons
+
+
+def intent_check(user_prompt, action):
+    """The parsed action must match an explicit balance/transfer request."""
+    text = user_prompt.lower()
+    if "balance" not in text and "transfer" not in text:
+        return None
+    asked = {_INTENT_ACTION[m.lastgroup] for m in _INTENT.finditer(text)}
+    if len(asked) == 1 and action not in asked:
+        return f"prompt asks for {asked.pop()} but parsed action is {action}"
+    return None
+
+
+def check(user_prompt, action, params, risk_threshold):
+    """Returns (ok, check_name, reason) for an extracted action."""
+    error = validate_params(action, params)
+    if error:
+        return False, "schema", f"Invalid params: {error}"
+    score, reasons = risk_score(user_prompt or "")
+    if score >= risk_threshold:
+        return False, "risk", f"Risk score {score}: {', '.join(sorted(reasons))}"
+    mismatch = intent_check(user_prompt or "", action)
+    if mismatch:
+        return False, "intent", mismatch
+    return True, None, None
@@ -0,0 +1,72 @@
+import copy
+import re
+import threading
+import time
+from collections import OrderedDict
+
+_WS = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt):
+    """Cache key for a user prompt: case-folded, whitespace-collapsed,
+    trailing punctuation dropped ("What's my  balance?" == "what's my balance")."""
+    return _WS.sub(" ", prompt).strip().rstrip("?!. ").casefold()
+
+
+class IntentCache:
+    """LRU + TTL cache of extracted intents, keyed on the normalized prompt.
+
+    Values are the (action, params, llm_output) triple produced for a prompt.
+    Nothing customer-specific is stored: the action is always executed
+    against the authenticated customer, so a hit can't leak another
+    customer's data.
+    """
+
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def get(self, prompt):
+        if not self.enabled:
+            return None
+        key = normalize_prompt(prompt)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(entry[1])
+
+    def put(self, prompt, value):
+        if not self.enabled:
+            return
+        key = normalize_prompt(prompt)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
@@ -0,0 +1,107 @@
+import fcntl
+import json
+import os
+import threading
+import zlib
+from contextlib import contextmanager
+
+LOCK_STRIPES = 64
+
+
+class Ledger:
+    """Append-only JSON-lines journal of balance changes.
+
+    Every entry carries a monotonically increasing `seq`. Appends are
+    fsync'd before they are acknowledged, so the journal is the source of
+    truth between snapshot compactions.
+
+    Locking works across threads *and* processes (gunicorn workers):
+      - account stripes: `fcntl` byte-range locks on `<data>.lock`, one byte
+        per stripe, paired with an in-process lock per stripe because fcntl
+        locks do not exclude threads of the same process.
+      - append lock: byte 0 of the same file; serializes seq assignment,
+        appends and compaction.
+    """
+
+    def __init__(self, data_path):
+        self.path = data_path + ".ledger"
+        self._lock_fd = os.open(data_path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        self._append_mutex = threading.Lock()
+        self._stripe_mutexes = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        os.close(os.open(self.path, os.O_WRONLY | os.O_CREAT, 0o644))
+
+    # ---- Locking ----
+    @staticmethod
+    def _stripe(account):
+        return zlib.crc32(str(account).encode()) % LOCK_STRIPES
+
+    @contextmanager
+    def _range_lock(self, mutex, offset):
+        with mutex:
+            fcntl.lockf(self._lock_fd, fcntl.LOCK_EX, 1, offset)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._lock_fd, fcntl.LOCK_UN, 1, offset)
+
+    @contextmanager
+    def account_locks(self, *accounts):
+        """Hold the stripe locks for `accounts`, always taken in stripe order."""
+        stripes = sorted({self._stripe(a) for a in accounts})
+        held = []
+        try:
+            for s in stripes:
+                cm = self._range_lock(self._stripe_mutexes[s], s + 1)
+                cm.__enter__()
+                held.append(cm)
+            yield
+        finally:
+            for cm in reversed(held):
+                cm.__exit__(None, None, None)
+
+    def append_lock(self):
+        return self._range_lock(self._append_mutex, 0)
+
+    # ---- Journal I/O ----
+    def stamp(self):
+        """(inode, size) of the journal; a new inode means it was compacted."""
+        st = os.stat(self.path)
+        return st.st_ino, st.st_size
+
+    def read_from(self, offset):
+        """Yield (entry, end_offset) for complete lines after `offset`.
+
+        A trailing line without a newline is a torn write and is skipped.
+        """
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                if line.strip():
+                    yield json.loads(line), offset
+
+    def truncate(self, offset):
+        """Drop a torn tail left behind by a crash mid-append."""
+        if os.path.getsize(self.path) > offset:
+            with open(self.path, "r+b") as f:
+                f.truncate(offset)
+                os.fsync(f.fileno())
+
+    def append(self, entry):
+        """Durably append one entry. Caller must hold `append_lock()`."""
+        line = (json.dumps(entry, separators=(",", ":")) + "\n").encode()
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        try:
+            os.write(fd, line)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def reset(self):
+        """Atomically replace the journal with an empty one (after compaction)."""
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
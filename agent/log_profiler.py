@@ -0,0 +1,390 @@
+# log_profiler.py
+"""Streaming profiler for the agent log: per-request timelines from log lines.
+
+Reads agent.log (and rotated/per-worker files) line by line in constant
+memory, in both formats found in production logs:
+
+  - JSON lines from utils.log_event / the LLM proxy: ms timestamps and a
+    request_id, so lines are grouped exactly; the agent's "chat_done" event
+    closes a request with its status and server-side duration;
+  - legacy "date | LEVEL | [CUST] msg" lines (second resolution, no request
+    id, multi-line messages): grouped per customer in arrival order and
+    closed by the werkzeug access line, which is a best-effort match.
+
+Time between consecutive markers is attributed to a stage:
+
+    auth        request start -> "Authenticated" (needs chat_done's duration)
+    prompt      "Authenticated" -> "Prompt to LLM" / cache or fast-path hit
+    llm         -> "LLM Output"
+    validation  -> guardrails / action validation
+    action      -> action result
+    respond     -> end of the request
+
+Reported: per-stage count and p50/p95/p99 (fixed log-scale histograms), hot
+prompts and customers (Space-Saving top-k), and the slowest requests.
+
+    python log_profiler.py /app/logs/agent.log [/app/logs/agent.log.1 ...] [--top 10] [--json out.json]
+"""
+import argparse
+import heapq
+import json
+import math
+import re
+from collections import OrderedDict, deque
+from datetime import datetime
+
+STAGES = ("auth", "prompt", "llm", "validation", "action", "respond")
+MAX_MESSAGE = 4096      # longer (multi-line) messages are truncated while reading
+MAX_PROMPT_KEY = 200
+
+LEGACY_RECORD = re.compile(r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}) \| (\w+) \| (?:\[(\w+)\] )?(.*)$")
+ACCESS_LINE = re.compile(r'"POST /(?:eval/)?chat HTTP/[\d.]+" (\d{3})')
+USER_PROMPT = re.compile(r"User: (.*)\Z", re.S)
+_WS = re.compile(r"\s+")
+
+
+# ---- Reading ----
+
+def _legacy_ts(text):
+    return datetime.strptime(text, "%Y-%m-%d %H:%M:%S").timestamp()
+
+
+def _json_ts(text):
+    return datetime.fromisoformat(text.replace("Z", "+00:00")).timestamp()
+
+
+def iter_records(path):
+    """Yields (ts, request_id, customer_id, msg); legacy multi-line messages joined."""
+    pending = None
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line.startswith('{"ts"'):
+                try:
+                    rec = json.loads(line)
+                    record = (_json_ts(rec["ts"]), rec.get("request_id"), rec.get("customer_id"),
+                              str(rec.get("msg", "")))
+                except (ValueError, KeyError):
+                    record = None
+                if record:
+                    if pending:
+                        yield pending
+                        pending = None
+                    yield record
+                    continue
+            m = LEGACY_RECORD.match(line)
+            if m:
+                if pending:
+                    yield pending
+                pending = (_legacy_ts(m.group(1)), None, m.group(3), m.group(4))
+            elif pending and len(pending[3]) < MAX_MESSAGE:
+                pending = pending[:3] + ((pending[3] + "\n" + line)[:MAX_MESSAGE],)
+    if pending:
+        yield pending
+
+
+def classify(msg):
+    """(marker, detail) for a log message, or (None, None)."""
+    if msg.startswith("Authenticated "):
+        return "start", msg[len("Authenticated "):].strip()
+    if msg.startswith("Prompt to LLM: "):
+        m = USER_PROMPT.search(msg)
+        return "prompt", m.group(1) if m else None
+    if msg.startswith(("Intent cache hit", "Fast path:")):
+        return "prompt", None
+    if msg.startswith("LLM Output:"):
+        return "llm", None
+    if msg.startswith(("Action Validation", "[Action Validation", "Guardrails blocked",
+                       "Detected clarify")):
+        return "validation", None
+    if msg.startswith('{"status": "simulated"') or msg.startswith('{"error"'):
+        return "action", None
+    if msg.startswith('{"event": "chat_done"'):
+        try:
+            return "end", json.loads(msg)
+        except ValueError:
+            return None, None
+    m = ACCESS_LINE.search(msg)
+    if m:
+        return "end", {"status": int(m.group(1))}
+    return None, None
+
+
+# ---- Requests ----
+
+class Request:
+    __slots__ = ("rid", "customer", "prompt", "marks", "last", "status", "server_ms")
+
+    def __init__(self, rid, customer, ts):
+        self.rid = rid
+        self.customer = customer
+        self.prompt = None
+        self.marks = {"start": ts}
+        self.last = ts
+        self.status = None
+        self.server_ms = None
+
+    def mark(self, marker, ts):
+        self.marks.setdefault(marker, ts)
+        self.last = max(self.last, ts)
+
+    def stage_times(self):
+        """{stage: seconds} from consecutive markers."""
+        times, prev = {}, self.marks["start"]
+        for marker, stage in (("prompt", "prompt"), ("llm", "llm"), ("validation", "validation"),
+                              ("action", "action"), ("end", "respond")):
+            if marker in self.marks:
+                times[stage] = max(self.marks[marker] - prev, 0.0)
+                prev = self.marks[marker]
+        if self.server_ms is not None and "end" in self.marks:
+            logged = self.marks["end"] - self.marks["start"]
+            times["auth"] = max(self.server_ms / 1000 - logged, 0.0)
+        return times
+
+    def total(self):
+        if self.server_ms is not None:
+            return self.server_ms / 1000
+        return self.last - self.marks["start"]
+
+
+class Grouper:
+    """Assembles records into Requests; at most `max_open` are held at once.
+
+    Requests are closed by their end marker, or as incomplete after `idle`
+    seconds without lines. Legacy lines are matched to the oldest open
+    request of the same customer that lacks that marker.
+    """
+
+    def __init__(self, on_done, idle=300.0, max_open=2000):
+        self.on_done = on_done
+        self.idle = idle
+        self.max_open = max_open
+        self.by_rid = OrderedDict()
+        self.legacy = deque()
+
+    def _finish(self, req, complete=True):
+        self.on_done(req, complete)
+
+    def feed(self, ts, rid, customer, msg):
+        marker, detail = classify(msg)
+        if rid:
+            req = self.by_rid.get(rid)
+            if req is None:
+                if marker not in ("start", "prompt"):
+                    return  # proxy or non-chat line of a request we never saw start
+                req = self.by_rid[rid] = Request(rid, customer, ts)
+            self.by_rid.move_to_end(rid)
+            self._update(req, marker, detail, ts, customer)
+            if marker == "end":
+                del self.by_rid[rid]
+                self._finish(req)
+            self._expire(ts)
+        elif marker:
+            self._feed_legacy(ts, customer, marker, detail)
+
+    def _update(self, req, marker, detail, ts, customer):
+        if customer and not req.customer:
+            req.customer = customer
+        if marker == "start":
+            req.customer = req.customer or detail
+        elif marker:
+            req.mark(marker, ts)
+        if marker == "prompt" and detail:
+            req.prompt = detail[:MAX_PROMPT_KEY]
+        elif marker == "end":
+            req.status = detail.get("status")
+            req.server_ms = detail.get("ms")
+        req.last = max(req.last, ts)
+
+    def _feed_legacy(self, ts, customer, marker, detail):
+        while self.legacy and ts - self.legacy[0].last > self.idle:
+            self._finish(self.legacy.popleft(), complete=False)
+        if marker == "start":
+            self.legacy.append(Request(None, detail, ts))
+            if len(self.legacy) > self.max_open:
+                self._finish(self.legacy.popleft(), complete=False)
+            return
+        if marker == "end" and detail.get("status") == 401:
+            return  # rejected before "Authenticated" was logged
+        for req in self.legacy:
+            if marker not in req.marks and (customer is None or req.customer == customer):
+                self._update(req, marker, detail, ts, customer)
+                if marker == "end":
+                    self.legacy.remove(req)
+                    self._finish(req)
+                return
+
+    def _expire(self, now):
+        while self.by_rid:
+            rid, req = next(iter(self.by_rid.items()))
+            if now - req.last <= self.idle and len(self.by_rid) <= self.max_open:
+                break
+            del self.by_rid[rid]
+            self._finish(req, complete=False)
+
+    def close(self):
+        for req in list(self.by_rid.values()) + list(self.legacy):
+            self._finish(req, complete=False)
+        self.by_rid.clear()
+        self.legacy.clear()
+
+
+# ---- Aggregates (bounded memory) ----
+
+class Histogram:
+    """Log-scale histogram from 0.1 ms to ~3 h, 40 buckets per decade (~6% wide);
+    percentiles are reported as the bucket's upper bound."""
+
+    PER_DECADE = 40
+    BUCKETS = 8 * PER_DECADE
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.n = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        i = 0 if seconds <= 1e-4 else \
+            min(math.ceil(math.log10(seconds / 1e-4) * self.PER_DECADE), self.BUCKETS - 1)
+        self.counts[i] += 1
+        self.n += 1
+        self.total += seconds
+
+    def percentile(self, q):
+        if not self.n:
+            return 0.0
+        rank, seen = q / 100 * self.n, 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                break
+        return 1e-4 * 10 ** (i / self.PER_DECADE)
+
+
+class TopK:
+    """Space-Saving heavy hitters: `capacity` counters, counts overestimate by at most `error`."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+
+    def add(self, key):
+        if key in self.counts:
+            self.counts[key] += 1
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = 1
+            self.errors[key] = 0
+        else:
+            victim = min(self.counts, key=self.counts.get)
+            floor = self.counts.pop(victim)
+            self.errors.pop(victim)
+            self.counts[key] = floor + 1
+            self.errors[key] = floor
+
+    def top(self, k):
+        return [(key, n, self.errors[key])
+                for key, n in sorted(self.counts.items(), key=lambda kv: -kv[1])[:k]]
+
+
+class Profile:
+    def __init__(self, top=10, outliers=10):
+        self.stages = {s: Histogram() for s in STAGES}
+        self.totals = Histogram()
+        self.prompts = TopK(top * 20)
+        self.customers = TopK(top * 20)
+        self.slowest = []  # min-heap of (total, seq, summary)
+        self.outliers = outliers
+        self.requests = 0
+        self.incomplete = 0
+        self.statuses = {}
+        self._seq = 0
+
+    def add(self, req, complete):
+        self.requests += 1
+        if not complete:
+            self.incomplete += 1
+        times = req.stage_times()
+        for stage, seconds in times.items():
+            self.stages[stage].add(seconds)
+        total = req.total()
+        self.totals.add(total)
+        if req.prompt:
+            self.prompts.add(_WS.sub(" ", req.prompt).strip().lower())
+        if req.customer:
+            self.customers.add(req.customer)
+        if req.status is not None:
+            self.statuses[req.status] = self.statuses.get(req.status, 0) + 1
+        self._seq += 1
+        summary = {"request_id": req.rid, "customer": req.customer, "start": req.marks["start"],
+                   "total_s": round(total, 4), "stages": {k: round(v, 4) for k, v in times.items()},
+                   "prompt": req.prompt, "complete": complete}
+        item = (total, self._seq, summary)
+        if len(self.slowest) < self.outliers:
+            heapq.heappush(self.slowest, item)
+        elif total > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, item)
+
+    def report(self, k):
+        return {
+            "requests": self.requests,
+            "incomplete": self.incomplete,
+            "statuses": self.statuses,
+            "total": _summary(self.totals),
+            "stages": {s: _summary(h) for s, h in self.stages.items()},
+            "hot_prompts": self.prompts.top(k),
+            "hot_customers": self.customers.top(k),
+            "slowest": [s for _, _, s in sorted(self.slowest, reverse=True)],
+        }
+
+
+def _summary(h):
+    return {"count": h.n, "mean_s": round(h.total / h.n, 4) if h.n else 0.0,
+            "p50_s": round(h.percentile(50), 4), "p95_s": round(h.percentile(95), 4),
+            "p99_s": round(h.percentile(99), 4)}
+
+
+def print_report(r):
+    print(f"requests: {r['requests']} ({r['incomplete']} incomplete)  statuses: {r['statuses']}")
+    print(f"\n{'stage':<12} {'count':>8} {'mean s':>9} {'p50 s':>9} {'p95 s':>9} {'p99 s':>9}")
+    for name, s in list(r["stages"].items()) + [("total", r["total"])]:
+        print(f"{name:<12} {s['count']:>8} {s['mean_s']:>9.3f} {s['p50_s']:>9.3f} "
+              f"{s['p95_s']:>9.3f} {s['p99_s']:>9.3f}")
+    print("\nhot prompts:")
+    for prompt, n, err in r["hot_prompts"]:
+        print(f"  {n:>6}{'~' if err else ' '} {prompt[:90]!r}")
+    print("\nhot customers:")
+    for customer, n, err in r["hot_customers"]:
+        print(f"  {n:>6}{'~' if err else ' '} {customer}")
+    print("\nslowest requests:")
+    for s in r["slowest"]:
+        stages = " ".join(f"{k}={v:.3f}" for k, v in s["stages"].items())
+        print(f"  {s['total_s']:>8.3f}s {s['request_id'] or '-':<16} {s['customer'] or '-':<8} "
+              f"{stages}  {(s['prompt'] or '')[:60]!r}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Per-request timelines and hot spots from agent logs")
+    ap.add_argument("logs", nargs="+")
+    ap.add_argument("--top", type=int, default=10, help="hot prompts / customers to show")
+    ap.add_argument("--outliers", type=int, default=10, help="slowest requests to show")
+    ap.add_argument("--idle", type=float, default=300.0,
+                    help="close a request after this many seconds without log lines")
+    ap.add_argument("--json", help="also write the report as JSON")
+    args = ap.parse_args()
+
+    profile = Profile(args.top, args.outliers)
+    for path in args.logs:
+        grouper = Grouper(profile.add, idle=args.idle)
+        for record in iter_records(path):
+            grouper.feed(*record)
+        grouper.close()
+    report = profile.report(args.top)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+from prometheus_client import Counter, Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Per-stage latency of the /chat pipeline
+STAGE_SECONDS = Histogram(
+    "agent_stage_seconds", "Time spent in each /chat pipeline stage", ["stage"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+CHAT_REQUESTS = Counter("agent_chat_requests_total", "/chat requests by outcome", ["outcome"])
+ACTIONS = Counter("agent_actions_total", "Extracted actions", ["action", "executed"])
+GUARDRAIL_BLOCKS = Counter("agent_guardrail_blocks_total", "Actions refused by guardrails",
+                           ["check"])
+EXTRACTOR_PATH = Counter("agent_extractor_path_total",
+                         "Which extractor path produced the result", ["path"])
+
+
+def stage(name):
+    """Context manager timing one pipeline stage: `with stage("auth"): ...`"""
+    return STAGE_SECONDS.labels(name).time()
+
+
+class _StatsCollector:
+    """Exports `stats()` dicts of in-process components (caches etc.) at scrape time."""
+
+    def __init__(self, prefix, stats_fn, counters):
+        self.prefix = prefix
+        self.stats_fn = stats_fn
+        self.counters = set(counters)
+
+    def collect(self):
+        for key, value in self.stats_fn().items():
+            if not isinstance(value, (int, float)):
+                continue
+            name = f"{self.prefix}_{key}"
+            if key in self.counters:
+                yield CounterMetricFamily(name, f"{self.prefix} {key}", value=value)
+            else:
+                yield GaugeMetricFamily(name, f"{self.prefix} {key}", value=value)
+
+
+def register_stats(prefix, stats_fn, counters=()):
+    REGISTRY.register(_StatsCollector(prefix, stats_fn, counters))
+
+
+def render():
+    """(body, content_type) in Prometheus text exposition format."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
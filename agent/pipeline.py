@@ -0,0 +1,191 @@
+import hashlib
+import json
+
+from config import (DATA_PATH, AUTO_EXECUTE, INTENT_CACHE_SIZE, INTENT_CACHE_TTL,
+                    FAST_PATH_MODE, FAST_PATH_THRESHOLD, FAST_PATH_FALLBACK,
+                    GUARDRAILS, GUARDRAILS_RISK_THRESHOLD)
+from utils import log_event
+from extractor import extract_action_from_text
+from actions import perform_action
+from actions import validate_action
+from intent_cache import IntentCache
+from fast_path import FastPathClassifier
+import guardrails
+from metrics import stage, ACTIONS, GUARDRAIL_BLOCKS, register_stats
+
+# Shared by the Flask (agent_server) and ASGI (agent_asgi) front-ends.
+
+SYSTEM_PROMPT = (
+    "System: You are a secure banking agent.\n"
+    "Respond ONLY with a valid JSON object of the form:\n"
+    "{ \"action\": \"<one of: clarify, get_balance, get_transactions, get_customer_info, transfer, freeze_account >\","
+    "  \"params\": { ... } }\n"
+    "Use these exact parameter patterns:\n"
+    "  - get_balance → {}\n"
+    "  - get_transactions → {\"n\":}\n"
+    "  - get_customer_info → {}\n"
+    "  - transfer → {\"to\":\"CUST###\",\"amount\":}\n"
+    "  - freeze_account → {}\n"
+    "  - clarify → {\"message\":\"Could you please specify what help you need — balance, transfer, or account info?\"}\n"
+    "If you do not understand the user's request or it is unrelated to banking, respond with the 'clarify' action.\n"
+    "Return ONLY the JSON object — no markdown, code fences, or plain text."
+)
+
+
+CLARIFY_PARAMS = {
+    "message": "Could you please specify what help you need — balance, transfer, or account info?"
+}
+
+intent_cache = IntentCache(INTENT_CACHE_SIZE, INTENT_CACHE_TTL)
+fast_path = FastPathClassifier(FAST_PATH_THRESHOLD)
+register_stats("agent_intent_cache", intent_cache.stats, counters=("hits", "misses"))
+register_stats("agent_fast_path", fast_path.stats,
+               counters=("seen", "caught", "compared_with_llm", "agreed_with_llm"))
+
+
+# The system prompt is logged once per process; requests refer to it by id
+SYSTEM_PROMPT_ID = hashlib.sha256(SYSTEM_PROMPT.encode()).hexdigest()[:12]
+log_event(f"System prompt {SYSTEM_PROMPT_ID}: {SYSTEM_PROMPT}")
+
+
+def describe_prompt(user_prompt):
+    """Log form of the LLM prompt, without repeating the system text."""
+    return f"[system {SYSTEM_PROMPT_ID}] User: {user_prompt}"
+
+
+def llm_request(user_prompt):
+    """Proxy payload. The constant system prompt travels separately so the
+    proxy can hand it to Ollama as a reusable prefix."""
+    return {"system": SYSTEM_PROMPT, "prompt": user_prompt}
+
+
+def cached_intent(user_prompt, current_customer_id):
+    """Resolve a prompt without the LLM, via the intent cache or the fast path.
+
+    Returns (action, params, llm_output) or None when the LLM is needed.
+    """
+    hit = intent_cache.get(user_prompt)
+    if hit:
+        log_event(f"Intent cache hit: {hit[0]}", current_customer_id)
+        return hit
+
+    if FAST_PATH_MODE == "on":
+        guess = fast_path.route(user_prompt)
+        if guess:
+            log_event(f"Fast path: {guess.action} {guess.params}", current_customer_id)
+            return guess.action, guess.params, None
+        if FAST_PATH_FALLBACK == "clarify":
+            return "clarify", dict(CLARIFY_PARAMS), None
+    elif FAST_PATH_MODE == "shadow":
+        fast_path.route(user_prompt)
+    return None
+
+
+def extract_intent(out, user_prompt):
+    """Extract the action from LLM output and remember it for `user_prompt`."""
+    with stage("extraction"):
+        action, params = extract_action_from_text(out)
+    if FAST_PATH_MODE != "off":
+        fast_path.record_agreement(user_prompt, action, params)
+    # Unparseable output (incl. proxy errors) is never cached
+    if action:
+        intent_cache.put(user_prompt, (action, params, out))
+    return action, params
+
+
+def handle_intent(action, params, out, current_customer_id, user_prompt="", dry_run=False):
+    """Validate and (optionally) execute an extracted action.
+    `user_prompt` feeds the guardrail checks when GUARDRAILS is on. With
+    `dry_run` nothing is executed; the body reports `would_execute` instead.
+    Returns the JSON-serializable /chat response body.
+    """
+    if not action:
+        return {
+            "clarification": "I didn't understand your request. "
+                             "Would you like balance, transactions, info, transfer, or freeze account?"
+        }
+
+    # --- Execute action (if allowed) ---
+    executed, would_execute, result = False, False, None
+    if action == "clarify":
+        result = params
+        executed = False
+    else:
+        # --- Guardrails: param schema, prompt risk, intent consistency ---
+        is_valid, reason = True, None
+        if GUARDRAILS:
+            with stage("guardrails"):
+                is_valid, failed_check, reason = guardrails.check(
+                    user_prompt, action, params, GUARDRAILS_RISK_THRESHOLD)
+            if not is_valid:
+                GUARDRAIL_BLOCKS.labels(failed_check).inc()
+                log_event(f"Guardrails blocked {action}: {reason}", current_customer_id)
+
+        # --- NEW: validate action before executing ---
+        if is_valid:
+            with stage("validation"):
+                is_valid, reason = validate_action(current_customer_id, action, params, DATA_PATH)
+            log_event(f"Action Validation: is_valid, reason - {is_valid}, {reason}", current_customer_id)
+        if not is_valid:
+            reason = "Invalid action - " + reason
+            result = {"error": reason}
+            executed = False
+        elif AUTO_EXECUTE and dry_run:
+            would_execute = True
+        elif AUTO_EXECUTE:
+            with stage("action"):
+                result = perform_action(action, params, DATA_PATH, current_customer_id)
+            executed = True
+
+    ACTIONS.labels(action, str(executed).lower()).inc()
+    with stage("response_formatting"):
+        response = {
+            "authenticated_user": current_customer_id,
+            "llm_output": out,
+            "action": action,
+            "params": params,
+            "executed": executed,
+            "action_result": result,
+            "message": format_message(action, executed, result)
+        }
+        if dry_run:
+            response["would_execute"] = would_execute
+        return response
+
+
+def format_message(action, executed, result):
+    """Generate the human-friendly message for an action result."""
+    user_message = ""
+
+    if action == "clarify":
+        user_message = result.get("message", "Could you please specify what help you need?")
+    elif action == "get_balance" and executed and isinstance(result, dict):
+        bal = result.get("balance")
+        cur = result.get("currency", "USD")
+        if bal is not None:
+            user_message = f"Your current account balance is {bal:.2f} {cur}."
+        else:
+            user_message = "Unable to retrieve your balance."
+    elif action == "get_transactions" and executed:
+        txs = result.get("transactions", [])
+        if txs:
+            user_message = f"Here are your last {len(txs)} transactions."
+        else:
+            user_message = "No transactions found."
+    elif action == "get_customer_info" and executed:
+        user_message = "Here is your account information."
+    elif action == "transfer" and executed:
+        amt = result.get("amount")
+        to = result.get("to")
+        if amt and to:
+            user_message = f"Transfer of ${amt:.2f} to {to} has been completed."
+        else:
+            user_message = f"Transfer could not be completed. Details: {json.dumps(result, ensure_ascii=False)}"
+    elif action == "freeze_account" and executed:
+        user_message = "Your account has been frozen as requested."
+    elif not action:
+        user_message = "I'm not sure what you meant. Could you clarify?"
+    else:
+        user_message = "Action executed."
+
+    return user_message
@@ -0,0 +1,148 @@
+# rate_limit.py
+import socket
+import threading
+import urllib.parse
+
+from flask import request
+from flask_limiter.util import get_remote_address
+from limits import parse
+from limits.storage import MemoryStorage, SlidingWindowCounterSupport, Storage, storage_from_string
+from limits.strategies import STRATEGIES
+
+from auth import validate_token
+from config import DATA_PATH
+
+
+class WindowStorage(Storage, SlidingWindowCounterSupport):
+    """limits storage backed by rate_limit_server.py.
+
+    Registered for the schemes
+
+        window://host:port            TCP (workers on several hosts)
+        window+unix:///path/to.sock   Unix socket (workers on one host)
+
+    so it is selected with RATE_LIMIT_STORAGE like the built-in memory:// or
+    redis:// backends. Every request thread keeps its own connection; a
+    broken connection is dropped and reopened on the next call.
+    """
+
+    STORAGE_SCHEME = ["window", "window+unix"]
+
+    def __init__(self, uri, wrap_exceptions=False, timeout=0.5, **options):
+        parsed = urllib.parse.urlparse(uri)
+        if parsed.scheme == "window+unix":
+            self._family, self._address = socket.AF_UNIX, parsed.path
+        else:
+            self._family, self._address = socket.AF_INET, (parsed.hostname or "127.0.0.1",
+                                                           parsed.port or 5010)
+        self._timeout = float(timeout)
+        self._local = threading.local()
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return OSError
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            sock = socket.socket(self._family, socket.SOCK_STREAM)
+            sock.settimeout(self._timeout)
+            sock.connect(self._address)
+            conn = self._local.conn = (sock, sock.makefile("rb"))
+        return conn
+
+    def _call(self, *args):
+        line = "\t".join(str(a) for a in args).encode() + b"\n"
+        try:
+            sock, reader = self._connection()
+            sock.sendall(line)
+            reply = reader.readline()
+            if not reply:
+                raise ConnectionError("rate limit server closed the connection")
+        except OSError:
+            self._close()
+            raise
+        reply = reply.decode().rstrip("\n")
+        if reply.startswith("ERR"):
+            raise OSError(f"rate limit server: {reply}")
+        return reply.split("\t")
+
+    def _close(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn:
+            conn[1].close()
+            conn[0].close()
+
+    # ---- Sliding window counter ----
+    def acquire_sliding_window_entry(self, key, limit, expiry, amount=1):
+        return self._call("ACQUIRE", key, limit, expiry, amount)[0] == "1"
+
+    def get_sliding_window(self, key, expiry):
+        prev, prev_ttl, cur, cur_ttl = self._call("WINDOW", key, expiry)
+        return int(prev), float(prev_ttl), int(cur), float(cur_ttl)
+
+    def clear_sliding_window(self, key, expiry):
+        self._call("CLEARWINDOW", key, expiry)
+
+    # ---- Fixed window ----
+    def incr(self, key, expiry, amount=1):
+        return int(self._call("INCR", key, expiry, amount)[0])
+
+    def get(self, key):
+        return int(self._call("GET", key)[0])
+
+    def get_expiry(self, key):
+        return float(self._call("EXPIRY", key)[0])
+
+    def check(self):
+        try:
+            return self._call("PING")[0] == "PONG"
+        except OSError:
+            return False
+
+    def reset(self):
+        return int(self._call("RESET")[0])
+
+    def clear(self, key):
+        self._call("CLEAR", key)
+
+
+def key_for(authorization, remote_addr):
+    """Rate-limit key: the authenticated customer, else the client address.
+
+    Keying on the customer rather than the raw Authorization header means
+    header variations (case, spacing) share one quota, and bad tokens are
+    limited per address instead of each getting a fresh bucket.
+    """
+    user, _ = validate_token(authorization, DATA_PATH)
+    if user:
+        return f"customer:{user['customer_id']}"
+    return f"ip:{remote_addr}"
+
+
+def customer_key():
+    """key_for() of the current Flask request (Limiter key_func)."""
+    return key_for(request.headers.get("Authorization"), get_remote_address())
+
+
+class RateLimiter:
+    """Per-key limits outside Flask (the ASGI app), on the `limits` library.
+
+    Uses the same storage URI and strategy as the Flask Limiter, so
+    window:// counters are shared with the rate limit server, and falls back
+    to per-process counters while the storage is unreachable.
+    """
+
+    def __init__(self, storage_uri, strategy):
+        self._limiter = STRATEGIES[strategy](storage_from_string(storage_uri))
+        self._fallback = STRATEGIES[strategy](MemoryStorage())
+
+    def hit(self, limit, key, scope):
+        """True if the request is within `limit` (e.g. "30 per minute")."""
+        item = parse(limit)
+        try:
+            return self._limiter.hit(item, key, scope)
+        except OSError:
+            return self._fallback.hit(item, key, scope)
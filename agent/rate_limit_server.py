@@ -0,0 +1,173 @@
+"""Shared rate-limit counter server for the agent workers.
+
+One process holds the counters for every gunicorn/uvicorn worker and host,
+so a configured limit is enforced once rather than once per process. It is
+reached over a Unix socket (workers on the same host) or TCP (several
+hosts); the agent side is rate_limit.WindowStorage.
+
+Protocol: one tab-separated command per line, one tab-separated reply line.
+
+    ACQUIRE key limit expiry amount  -> 1 | 0     sliding window counter
+    WINDOW  key expiry               -> prev  prev_ttl  cur  cur_ttl
+    CLEARWINDOW key expiry           -> OK
+    INCR    key expiry amount        -> count     fixed window
+    GET     key                      -> count
+    EXPIRY  key                      -> unix time the key expires
+    CLEAR   key                      -> OK
+    RESET                            -> number of keys dropped
+    PING                             -> PONG
+
+Sliding windows keep three numbers per key (window index, previous and
+current count), so memory is O(1) per key whatever the limit. Commands run
+on a single event loop, which makes check-and-increment atomic.
+
+    python rate_limit_server.py --unix /run/agent/limiter.sock
+    python rate_limit_server.py --host 0.0.0.0 --port 5010
+"""
+import argparse
+import asyncio
+import os
+import time
+
+SWEEP_INTERVAL = 30.0
+READ_SIZE = 65536  # also the longest command line accepted
+
+
+class Counters:
+    def __init__(self):
+        self.windows = {}  # (key, expiry) -> [window index, previous count, current count]
+        self.fixed = {}    # key -> [count, expires at]
+
+    # ---- Sliding window counter ----
+    def _window(self, key, expiry, now):
+        idx = int(now // expiry)
+        w = self.windows.get((key, expiry))
+        if w is None:
+            w = self.windows[(key, expiry)] = [idx, 0, 0]
+        elif w[0] != idx:
+            # Roll forward: the old current window becomes the previous one
+            w[1] = w[2] if w[0] == idx - 1 else 0
+            w[2] = 0
+            w[0] = idx
+        return w
+
+    def window_info(self, key, expiry, now):
+        w = self._window(key, expiry, now)
+        elapsed = now % expiry
+        prev_ttl = float(expiry - elapsed) if w[1] else 0.0
+        return w[1], prev_ttl, w[2], float(2 * expiry - elapsed)
+
+    def acquire(self, key, limit, expiry, amount, now):
+        if amount > limit:
+            return False
+        w = self._window(key, expiry, now)
+        weighted = w[1] * (expiry - now % expiry) / expiry + w[2]
+        if int(weighted) + amount > limit:
+            return False
+        w[2] += amount
+        return True
+
+    # ---- Fixed window ----
+    def incr(self, key, expiry, amount, now):
+        c = self.fixed.get(key)
+        if c is None or c[1] <= now:
+            c = self.fixed[key] = [0, now + expiry]
+        c[0] += amount
+        return c[0]
+
+    def get(self, key, now):
+        c = self.fixed.get(key)
+        return c[0] if c and c[1] > now else 0
+
+    def sweep(self, now):
+        """Drop keys that can no longer affect a decision."""
+        self.windows = {k: w for k, w in self.windows.items() if w[0] >= int(now // k[1]) - 1}
+        self.fixed = {k: c for k, c in self.fixed.items() if c[1] > now}
+
+    def handle(self, parts, now):
+        cmd = parts[0]
+        if cmd == "ACQUIRE":
+            return "1" if self.acquire(parts[1], int(parts[2]), int(parts[3]), int(parts[4]), now) else "0"
+        if cmd == "WINDOW":
+            return "\t".join(str(v) for v in self.window_info(parts[1], int(parts[2]), now))
+        if cmd == "CLEARWINDOW":
+            self.windows.pop((parts[1], int(parts[2])), None)
+            return "OK"
+        if cmd == "INCR":
+            return str(self.incr(parts[1], int(parts[2]), int(parts[3]), now))
+        if cmd == "GET":
+            return str(self.get(parts[1], now))
+        if cmd == "EXPIRY":
+            c = self.fixed.get(parts[1])
+            return str(c[1] if c and c[1] > now else now)
+        if cmd == "CLEAR":
+            self.fixed.pop(parts[1], None)
+            for k in [k for k in self.windows if k[0] == parts[1]]:
+                del self.windows[k]
+            return "OK"
+        if cmd == "RESET":
+            n = len(self.windows) + len(self.fixed)
+            self.windows.clear()
+            self.fixed.clear()
+            return str(n)
+        if cmd == "PING":
+            return "PONG"
+        return "ERR unknown command"
+
+
+async def serve_client(counters, reader, writer):
+    pending = b""
+    try:
+        while True:
+            # Everything already received is answered with one write, so
+            # pipelined commands cost one send
+            chunk = await reader.read(READ_SIZE)
+            if not chunk:
+                break
+            *lines, pending = (pending + chunk).split(b"\n")
+            if len(pending) > READ_SIZE:
+                break  # not our protocol
+            replies = []
+            for line in lines:
+                try:
+                    replies.append(counters.handle(line.decode().split("\t"), time.time()))
+                except (IndexError, ValueError, ZeroDivisionError) as e:
+                    replies.append(f"ERR {e}")
+            if replies:
+                writer.write("".join(r + "\n" for r in replies).encode())
+                await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def sweeper(counters):
+    while True:
+        await asyncio.sleep(SWEEP_INTERVAL)
+        counters.sweep(time.time())
+
+
+async def main(args):
+    counters = Counters()
+    handler = lambda r, w: serve_client(counters, r, w)
+    if args.unix:
+        if os.path.exists(args.unix):
+            os.unlink(args.unix)
+        server = await asyncio.start_unix_server(handler, path=args.unix)
+        os.chmod(args.unix, 0o660)
+        print(f"rate limit server on unix:{args.unix}")
+    else:
+        server = await asyncio.start_server(handler, args.host, args.port)
+        print(f"rate limit server on {args.host}:{args.port}")
+    asyncio.create_task(sweeper(counters))
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Shared sliding-window rate limit counters")
+    ap.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=5010)
+    asyncio.run(main(ap.parse_args()))
@@ -0,0 +1,468 @@
+# snapshot.py
+"""Columnar, memory-mapped customer snapshot (`*.snap`).
+
+The JSON data file has to be parsed in full before the first lookup. A
+snapshot stores the same data as fixed-width columns plus one string table,
+and is opened with mmap: start-up reads only the section directory, pages are
+shared by every worker process mapping the file, and a customer is
+materialized (as the usual dict) only when it is looked up.
+
+Layout (native byte order, sections 8-byte aligned):
+
+    header     MAGIC, version, section count
+    directory  per section: name (16 bytes), offset, length, array typecode
+    sections
+      meta                JSON: top-level keys other than "customers"
+      str.off / str.data  string table: offsets (Q) into a UTF-8 blob
+      c.<field>           customer columns: string refs (I), balance (d),
+                          flags (B), tx.start (Q, first transaction row)
+      t.<field>           transaction columns, same scheme
+      i.customer_id / i.account_id   rows sorted by key, for binary search
+      i.token_digest / i.token_row   SHA-256 of auth tokens, sorted, and rows
+
+String refs are indexes into the string table; NONE marks a missing key.
+Fields without a column are kept as a JSON string in c.extra / t.extra, so
+conversion to and from JSON is lossless.
+
+    python snapshot.py data/customers_transactions.json data/customers.snap
+    python snapshot.py data/customers.snap restored.yaml
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+from array import array
+
+MAGIC = b"BANKSNP1"
+VERSION = 1
+NONE = 0xFFFFFFFF
+_HEADER = struct.Struct("=8sII")
+_ENTRY = struct.Struct("=16sQQc")
+
+# (column, path in the customer dict)
+CUSTOMER_STRINGS = [
+    ("customer_id", ("customer_id",)),
+    ("auth_token_b64", ("auth_token_b64",)),
+    ("name", ("name",)),
+    ("dob", ("dob",)),
+    ("ssn_simulated", ("ssn_simulated",)),
+    ("account_id", ("account", "account_id")),
+    ("routing_number", ("account", "routing_number")),
+    ("account_type", ("account", "account_type")),
+    ("currency", ("account", "currency")),
+    ("phone", ("contact", "phone")),
+    ("email", ("contact", "email")),
+    ("address", ("contact", "address")),
+]
+TX_STRINGS = ["tx_id", "date", "description", "counterparty"]
+
+# flags bits for a number column
+IS_INT, MISSING = 1, 2
+
+
+def _number_flags(value):
+    if value is None:
+        return 0.0, MISSING
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"not a number: {value!r}")
+    return float(value), IS_INT if isinstance(value, int) else 0
+
+
+def _number(value, flags):
+    if flags & MISSING:
+        return None
+    return int(value) if flags & IS_INT else value
+
+
+def _pop_path(d, path):
+    """Remove and return d[path...]; drops containers left empty."""
+    if len(path) == 1:
+        return d.pop(path[0], None)
+    inner = d.get(path[0])
+    if not isinstance(inner, dict):
+        return None
+    value = _pop_path(inner, path[1:])
+    if not inner:
+        del d[path[0]]
+    return value
+
+
+# ---- Writing ----
+
+class _StringTable:
+    """New strings; with `base_count`, appended to an existing table of that
+    many strings whose data is `base_size` bytes (offsets then hold only the
+    new ends)."""
+
+    def __init__(self, base_count=0, base_size=0):
+        self.ids = {}
+        self.offsets = array("Q", [] if base_count else [0])
+        self.data = bytearray()
+        self._next = base_count
+        self._base_size = base_size
+
+    def ref(self, value):
+        if value is None:
+            return NONE
+        if not isinstance(value, str):
+            raise ValueError(f"not a string: {value!r}")
+        i = self.ids.get(value)
+        if i is None:
+            i = self.ids[value] = self._next
+            self._next += 1
+            self.data += value.encode()
+            self.offsets.append(self._base_size + len(self.data))
+        return i
+
+
+def _columns():
+    cols = {f"c.{name}": array("I") for name, _ in CUSTOMER_STRINGS}
+    cols.update({"c.extra": array("I"), "c.balance": array("d"), "c.flags": array("B"),
+                 "c.tx.start": array("Q", [0])})
+    cols.update({f"t.{name}": array("I") for name in TX_STRINGS})
+    cols.update({"t.extra": array("I"), "t.amount": array("d"), "t.flags": array("B")})
+    return cols
+
+
+def _encode_customer(customer, cols, ref):
+    """Append one customer's c.* values (all but c.tx.start) to `cols`;
+    returns its transactions. `ref(column, value)` gives string refs."""
+    # Private copy to pop fields from; paths are at most two levels deep
+    c = {k: dict(v) if isinstance(v, dict) else v for k, v in customer.items()}
+    txs = c.pop("transactions", None)
+    for name, field_path in CUSTOMER_STRINGS:
+        cols[f"c.{name}"].append(ref(f"c.{name}", _pop_path(c, field_path)))
+    balance, flags = _number_flags(_pop_path(c, ("account", "balance")))
+    cols["c.balance"].append(balance)
+    if txs is None:
+        flags |= MISSING << 2  # no "transactions" key at all
+        txs = []
+    cols["c.flags"].append(flags)
+    cols["c.extra"].append(ref("c.extra", json.dumps(c) if c else None))
+    return txs
+
+
+def _encode_transaction(tx, cols, strings):
+    tx = dict(tx)
+    for name in TX_STRINGS:
+        cols[f"t.{name}"].append(strings.ref(tx.pop(name, None)))
+    amount, tflags = _number_flags(tx.pop("amount", None))
+    cols["t.amount"].append(amount)
+    cols["t.flags"].append(tflags)
+    cols["t.extra"].append(strings.ref(json.dumps(tx) if tx else None))
+
+
+def _sorted_rows(refs, strings):
+    data, offs = strings.data, strings.offsets
+    rows = [r for r in range(len(refs)) if refs[r] != NONE]
+    rows.sort(key=lambda r: data[offs[refs[r]]:offs[refs[r] + 1]])
+    return array("I", rows)
+
+
+def _token_index(refs, strings):
+    """(sorted SHA-256 digests of the auth tokens, their rows)."""
+    data, offs = strings.data, strings.offsets
+    keys = sorted((hashlib.sha256(data[offs[ref]:offs[ref + 1]]).digest(), row)
+                  for row, ref in enumerate(refs) if ref != NONE)
+    return b"".join(d for d, _ in keys), array("I", [r for _, r in keys])
+
+
+def _write_sections(path, sections):
+    """Write sections as a snapshot file, atomically. A section is
+    (name, array or bytes) or (name, [buffers written back to back], typecode)."""
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        offset = _HEADER.size + _ENTRY.size * len(sections)
+        directory, blobs = [], []
+        for name, value, *typecode in sections:
+            if typecode:
+                parts, typecode = value, typecode[0].encode()
+            elif isinstance(value, array):
+                parts, typecode = [value], value.typecode.encode()
+            else:
+                parts, typecode = [value], b"c"
+            length = sum(memoryview(part).nbytes for part in parts)
+            offset += -offset % 8
+            directory.append(_ENTRY.pack(name.encode(), offset, length, typecode))
+            blobs.append((offset, parts))
+            offset += length
+        f.write(_HEADER.pack(MAGIC, VERSION, len(sections)))
+        f.write(b"".join(directory))
+        for offset, parts in blobs:
+            f.write(b"\0" * (offset - f.tell()))
+            for part in parts:
+                f.write(part)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _sections(meta, strings, cols):
+    return [("meta", json.dumps(meta).encode()), ("str.off", strings.offsets),
+            ("str.data", bytes(strings.data))] + list(cols.items())
+
+
+def write_snapshot(path, data):
+    """Write `data` ({"customers": [...], ...}) as a snapshot, atomically."""
+    strings = _StringTable()
+    cols = _columns()
+    ref = lambda column, value: strings.ref(value)  # noqa: E731
+    for customer in data.get("customers", []):
+        for tx in _encode_customer(customer, cols, ref):
+            _encode_transaction(tx, cols, strings)
+        cols["c.tx.start"].append(len(cols["t.amount"]))
+
+    cols["i.customer_id"] = _sorted_rows(cols["c.customer_id"], strings)
+    cols["i.account_id"] = _sorted_rows(cols["c.account_id"], strings)
+    cols["i.token_digest"], cols["i.token_row"] = _token_index(cols["c.auth_token_b64"], strings)
+    meta = {k: v for k, v in data.items() if k != "customers"}
+    _write_sections(path, _sections(meta, strings, cols))
+
+
+def _copy(view, start=0, end=None):
+    """array copy of (a slice of) a mapped column."""
+    a = array(view.format)
+    a.frombytes(view[start:end].cast("B"))
+    return a
+
+
+# ---- Reading ----
+
+class MappedSnapshot:
+    """Read-only view of a snapshot file. Opening it costs one mmap and a
+    directory read; columns are memoryviews over the mapping."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: not a version {VERSION} customer snapshot")
+        buf = memoryview(self._mm)
+        self._cols = {}
+        for i in range(count):
+            name, offset, length, typecode = _ENTRY.unpack_from(self._mm, _HEADER.size + i * _ENTRY.size)
+            view = buf[offset:offset + length]
+            typecode = typecode.decode()
+            self._cols[name.rstrip(b"\0").decode()] = view if typecode == "c" else view.cast(typecode)
+        self.meta = json.loads(bytes(self._cols["meta"]))
+        self._str_off = self._cols["str.off"]
+        self._str_data = self._cols["str.data"]
+
+    def __len__(self):
+        return len(self._cols["c.balance"])
+
+    def _bytes(self, ref):
+        return bytes(self._str_data[self._str_off[ref]:self._str_off[ref + 1]])
+
+    def string(self, ref):
+        return None if ref == NONE else self._bytes(ref).decode()
+
+    # ---- Lookups (binary search, nothing loaded up front) ----
+    def _find(self, index, column, key):
+        rows, refs, key = self._cols[index], self._cols[column], key.encode()
+        lo, hi = 0, len(rows)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._bytes(refs[rows[mid]]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(rows) and self._bytes(refs[rows[lo]]) == key:
+            return rows[lo]
+        return None
+
+    def find_customer_id(self, customer_id):
+        return self._find("i.customer_id", "c.customer_id", customer_id)
+
+    def find_account_id(self, account_id):
+        return self._find("i.account_id", "c.account_id", account_id)
+
+    def find_token_digest(self, digest):
+        """Row whose auth token hashes (SHA-256) to `digest`, or None."""
+        digests = self._cols["i.token_digest"]
+        lo, hi = 0, len(digests) // 32
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if bytes(digests[mid * 32:mid * 32 + 32]) < digest:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(digests) // 32 and bytes(digests[lo * 32:lo * 32 + 32]) == digest:
+            return self._cols["i.token_row"][lo]
+        return None
+
+    def token(self, row):
+        return self.string(self._cols["c.auth_token_b64"][row])
+
+    # ---- Incremental rewrite ----
+    def rewrite(self, path, meta, changed):
+        """Write this snapshot with the customers in `changed` ({row: customer})
+        replaced, atomically, without decoding the unchanged rows.
+
+        Customer columns are copied from the mapping and patched at the
+        changed rows; transaction columns, the string table and the key
+        indexes are written straight from the mapping, in runs between the
+        changed rows. Transactions are append-only, so a changed customer
+        keeps its mapped transactions and only the new tail is encoded. The
+        key indexes are rebuilt only if a changed row's id, account id or
+        token changed. Strings dropped by changed rows stay in the table
+        until the next full write.
+        """
+        old = self._cols
+        strings = _StringTable(len(self._str_off) - 1, self._str_off[-1])
+        cols = {name: _copy(old[name]) for name in _columns()
+                if name.startswith("c.") and name != "c.tx.start"}
+
+        keys_changed = False
+        patch = _columns()
+        rows = sorted(changed)
+        tails = {}
+        for row in rows:
+            def ref(column, value, row=row):
+                # Unchanged fields keep their old string
+                old_ref = old[column][row]
+                return old_ref if self.string(old_ref) == value else strings.ref(value)
+
+            for column in patch:
+                del patch[column][:]
+            tails[row] = _encode_customer(changed[row], patch, ref)
+            for column, values in patch.items():
+                if column in cols:
+                    keys_changed |= (column in ("c.customer_id", "c.account_id", "c.auth_token_b64")
+                                     and values[0] != old[column][row])
+                    cols[column][row] = values[0]
+
+        # Transactions: old runs up to the end of each changed customer, then its new tail
+        starts = old["c.tx.start"]
+        new_starts = array("Q")
+        tx_parts = {name: [] for name in old if name.startswith("t.")}
+        copied, shift, prev = 0, 0, 0
+        for row in rows:
+            txs = tails[row]
+            begin, end = starts[row], starts[row + 1]
+            if len(txs) < end - begin:
+                raise ValueError(f"row {row}: transactions were removed, full write needed")
+            new_starts.extend(map(shift.__add__, starts[prev:row + 1]))
+            tail = {name: array(old[name].format) for name in tx_parts}
+            for tx in txs[end - begin:]:
+                _encode_transaction(tx, tail, strings)
+            for name, parts in tx_parts.items():
+                parts += [old[name][copied:end], tail[name]]
+            copied, prev = end, row + 1
+            shift += len(txs) - (end - begin)
+        new_starts.extend(map(shift.__add__, starts[prev:]))
+        for name, parts in tx_parts.items():
+            parts.append(old[name][copied:])
+        cols["c.tx.start"] = new_starts
+
+        if keys_changed:
+            full = _StringTable()
+            full.offsets = _copy(self._str_off) + strings.offsets
+            full.data = bytearray(self._str_data) + strings.data
+            cols["i.customer_id"] = _sorted_rows(cols["c.customer_id"], full)
+            cols["i.account_id"] = _sorted_rows(cols["c.account_id"], full)
+            cols["i.token_digest"], cols["i.token_row"] = _token_index(cols["c.auth_token_b64"], full)
+            indexes = list(cols.items())
+        else:
+            indexes = [(name, [old[name]], "I") for name in ("i.customer_id", "i.account_id",
+                                                            "i.token_row")]
+            indexes.append(("i.token_digest", [old["i.token_digest"]], "c"))
+        sections = [("meta", json.dumps(meta).encode()),
+                    ("str.off", [self._str_off, strings.offsets], "Q"),
+                    ("str.data", [self._str_data, strings.data], "c")]
+        sections += [(name, value) for name, value in cols.items() if not name.startswith("i.")]
+        sections += [(name, parts, old[name].format) for name, parts in tx_parts.items()]
+        sections += [s for s in indexes if s[0].startswith("i.")]
+        _write_sections(path, sections)
+
+    # ---- Materialization ----
+    def customer(self, row):
+        """The customer at `row` as the dict the JSON file would give."""
+        cols = self._cols
+        c = {}
+        for name, field_path in CUSTOMER_STRINGS:
+            value = self.string(cols[f"c.{name}"][row])
+            if value is not None:
+                target = c
+                for key in field_path[:-1]:
+                    target = target.setdefault(key, {})
+                target[field_path[-1]] = value
+        flags = cols["c.flags"][row]
+        balance = _number(cols["c.balance"][row], flags & 3)
+        if balance is not None:
+            c.setdefault("account", {})["balance"] = balance
+        extra = self.string(cols["c.extra"][row])
+        if extra:
+            for key, value in json.loads(extra).items():
+                if isinstance(value, dict) and isinstance(c.get(key), dict):
+                    c[key].update(value)
+                else:
+                    c[key] = value
+        if not flags & (MISSING << 2):
+            start, end = cols["c.tx.start"][row], cols["c.tx.start"][row + 1]
+            c["transactions"] = [self.transaction(i) for i in range(start, end)]
+        return c
+
+    def transaction(self, i):
+        cols = self._cols
+        tx = {}
+        for name in TX_STRINGS:
+            value = self.string(cols[f"t.{name}"][i])
+            if value is not None:
+                tx[name] = value
+        amount = _number(cols["t.amount"][i], cols["t.flags"][i])
+        if amount is not None:
+            tx["amount"] = amount
+        extra = self.string(cols["t.extra"][i])
+        if extra:
+            tx.update(json.loads(extra))
+        return tx
+
+    def to_data(self):
+        """The whole file as a JSON-style document."""
+        data = dict(self.meta)
+        data["customers"] = [self.customer(row) for row in range(len(self))]
+        return data
+
+
+# ---- Conversion ----
+
+def load_any(path):
+    if path.endswith(".snap"):
+        return MappedSnapshot(path).to_data()
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            import yaml  # only needed for YAML conversion
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def save_any(path, data):
+    if path.endswith(".snap"):
+        write_snapshot(path, data)
+        return
+    with open(path, "w") as f:
+        if path.endswith((".yaml", ".yml")):
+            import yaml
+            yaml.safe_dump(data, f, sort_keys=False, allow_unicode=True)
+        else:
+            json.dump(data, f, indent=2)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Convert customer data between JSON, YAML and .snap")
+    ap.add_argument("src", help="input file (.json, .yaml/.yml or .snap)")
+    ap.add_argument("dst", help="output file (.json, .yaml/.yml or .snap)")
+    args = ap.parse_args()
+    data = load_any(args.src)
+    save_any(args.dst, data)
+    print(f"{args.src} -> {args.dst}: {len(data.get('customers', []))} customers, "
+          f"{os.path.getsize(args.dst) / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
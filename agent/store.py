@@ -0,0 +1,273 @@
+import os
+import threading
+import time
+
+from config import LEDGER_COMPACT_EVERY
+from ledger import Ledger
+from snapshot import MappedSnapshot
+from tx_index import TransactionIndex
+from utils import load_data, save_data, log_event
+
+
+class CustomerStore:
+    """Resident, indexed view of the customer data file.
+
+    The file is parsed once and kept in memory together with hash indexes on
+    customer id and account id (auth tokens are indexed by auth.TokenIndex,
+    which rebuilds when `generation` changes). Each customer's transactions
+    also get a date-sorted `TransactionIndex`, built on first query. Balance
+    changes are not written back to the file; they go to an append-only
+    `Ledger` and are replayed on top of the snapshot. `refresh()` costs two
+    stat() calls: the snapshot is re-read only when it changed on disk, and
+    new journal entries written by other workers are applied incrementally.
+
+    A `.snap` data path (see snapshot.py) is mmapped instead of parsed:
+    customers are materialized on first lookup and the indexes fill lazily.
+    """
+
+    def __init__(self, data_path):
+        self.data_path = data_path
+        self.data = {"customers": []}
+        self.lock = threading.RLock()
+        self.ledger = Ledger(data_path)
+        self._stamp = None
+        self._ledger_stamp = None
+        self._ledger_offset = 0
+        self._snapshot_seq = 0
+        self.seq = 0
+        self.generation = 0  # bumped whenever the customer set is re-indexed
+        self._by_customer_id = {}
+        self._by_account_id = {}
+        self._tx_indexes = {}
+        self.snapshot = None
+        self._rows = {}  # snapshot row -> materialized customer
+        self._dirty = set()  # customer ids changed since the snapshot was written
+
+    def _file_stamp(self):
+        st = os.stat(self.data_path)
+        return st.st_mtime_ns, st.st_size
+
+    def _index(self):
+        self._by_customer_id = {}
+        self._by_account_id = {}
+        self._tx_indexes = {}
+        self._rows = {}
+        self._dirty = set()
+        for c in self.data.get("customers", []):
+            self._index_customer(c)
+        self.generation += 1
+
+    def _index_customer(self, c):
+        if c.get("customer_id"):
+            self._by_customer_id[c["customer_id"]] = c
+        account_id = c.get("account", {}).get("account_id")
+        if account_id:
+            self._by_account_id[account_id] = c
+
+    def load(self):
+        """Load the snapshot, replay the journal and drop any torn tail."""
+        with self.lock, self.ledger.append_lock():
+            self._load()
+            self.ledger.truncate(self._ledger_offset)
+
+    def _load(self):
+        stamp = self._file_stamp()
+        if self.data_path.endswith(".snap"):
+            self.snapshot = MappedSnapshot(self.data_path)
+            self.data = dict(self.snapshot.meta, customers=[])
+        else:
+            self.data = load_data(self.data_path)
+        self._stamp = stamp
+        self._snapshot_seq = self.seq = self.data.get("ledger_seq", 0)
+        self._ledger_stamp = None
+        self._ledger_offset = 0
+        self._index()
+        replayed = self._catch_up()
+        count = len(self.snapshot) if self.snapshot else len(self._by_customer_id)
+        log_event(f"Customer store loaded: {count} customers, "
+                  f"{replayed} ledger entries replayed")
+
+    def refresh(self):
+        """Pick up snapshot changes and journal entries from other workers."""
+        with self.lock:
+            if self._file_stamp() != self._stamp:
+                self._load()
+            elif self.ledger.stamp() != self._ledger_stamp:
+                self._catch_up()
+
+    # ---- Snapshot materialization ----
+    def _materialize(self, row):
+        with self.lock:
+            c = self._rows.get(row)
+            if c is None:
+                c = self._rows[row] = self.snapshot.customer(row)
+                self._index_customer(c)
+            return c
+
+    def _customer(self, customer_id):
+        c = self._by_customer_id.get(customer_id)
+        if c is None and self.snapshot is not None:
+            row = self.snapshot.find_customer_id(customer_id)
+            if row is not None:
+                c = self._materialize(row)
+        return c
+
+    def _account(self, account_id):
+        c = self._by_account_id.get(account_id)
+        if c is None and self.snapshot is not None:
+            row = self.snapshot.find_account_id(account_id)
+            if row is not None:
+                c = self._materialize(row)
+        return c
+
+    # ---- Journal replay ----
+    def _catch_up(self):
+        stamp = self.ledger.stamp()
+        if self._ledger_stamp and stamp[0] != self._ledger_stamp[0]:
+            # Journal was compacted by another worker: start over from the snapshot
+            self._load()
+            return 0
+        applied = 0
+        for entry, offset in self.ledger.read_from(self._ledger_offset):
+            self._ledger_offset = offset
+            if entry["seq"] <= self.seq:
+                continue
+            if entry["seq"] != self.seq + 1:
+                raise RuntimeError(f"Ledger gap: expected seq {self.seq + 1}, got {entry['seq']}")
+            self._apply(entry)
+            applied += 1
+        self._ledger_stamp = (stamp[0], self._ledger_offset)
+        return applied
+
+    def _apply(self, entry):
+        if entry["type"] == "transfer":
+            src = self._customer(entry["from"])
+            dst = self._customer(entry["to"])
+            amount = entry["amount"]
+            src["account"]["balance"] -= amount
+            dst["account"]["balance"] += amount
+            self._add_transaction(src, {
+                "tx_id": entry["tx_id"],
+                "date": entry["date"],
+                "amount": -amount,
+                "description": f"Transfer to {entry['to']}"
+            })
+            self._add_transaction(dst, {
+                "tx_id": entry["tx_id"],
+                "date": entry["date"],
+                "amount": amount,
+                "description": f"Transfer from {entry['from']}"
+            })
+            self._dirty.update((entry["from"], entry["to"]))
+        self.seq = entry["seq"]
+
+    def _add_transaction(self, customer, tx):
+        customer["transactions"].append(tx)
+        index = self._tx_indexes.get(customer["customer_id"])
+        if index is not None:
+            index.add(tx)
+
+    # ---- Writes ----
+    def transfer(self, src_id, dst_id, amount):
+        """Move `amount` between customers through the ledger.
+
+        Returns the journal entry, or None if funds are insufficient.
+        """
+        with self.ledger.account_locks(src_id, dst_id):
+            self.refresh()
+            src = self._customer(src_id)
+            if not src["account"]["balance"] >= amount > 0:
+                return None
+
+            with self.lock, self.ledger.append_lock():
+                self._catch_up()
+                ts = int(time.time())
+                seq = self.seq + 1
+                entry = {
+                    "seq": seq,
+                    "type": "transfer",
+                    # The ledger seq makes ids unique and increasing across workers
+                    "tx_id": f"TX-{ts}-{seq}",
+                    "date": time.strftime("%Y-%m-%d"),
+                    "ts": ts,
+                    "from": src_id,
+                    "to": dst_id,
+                    "amount": amount,
+                }
+                self.ledger.append(entry)
+                self._apply(entry)
+                self._catch_up()
+                if self.seq - self._snapshot_seq >= LEDGER_COMPACT_EVERY:
+                    self._compact()
+        return entry
+
+    def _compact(self):
+        """Fold the journal into a new snapshot. Caller holds the append lock."""
+        self.data["ledger_seq"] = self.seq
+        if self.snapshot is not None:
+            # Only customers touched by the journal are re-encoded
+            changed = {self.snapshot.find_customer_id(cid): self._customer(cid)
+                       for cid in self._dirty}
+            meta = {k: v for k, v in self.data.items() if k != "customers"}
+            self.snapshot.rewrite(self.data_path, meta, changed)
+            self.snapshot = MappedSnapshot(self.data_path)
+            self._dirty = set()
+        else:
+            save_data(self.data_path, self.data)
+        self.ledger.reset()
+        self._stamp = self._file_stamp()
+        self._ledger_stamp = self.ledger.stamp()
+        self._ledger_offset = 0
+        self._snapshot_seq = self.seq
+        log_event(f"Ledger compacted into snapshot at seq {self.seq}")
+
+    # ---- Lookups ----
+    def customers(self):
+        """(generation, customer list) as of the last refresh (JSON data only)."""
+        with self.lock:
+            return self.generation, list(self.data.get("customers", []))
+
+    def by_token_digest(self, digest):
+        """(auth token, customer) for a SHA-256 token digest, snapshot data only."""
+        self.refresh()
+        row = self.snapshot.find_token_digest(digest)
+        if row is None:
+            return None
+        return self.snapshot.token(row).encode(), self._materialize(row)
+
+    def recent_transactions(self, customer_id, limit, cursor=None, since=None, until=None,
+                            counterparty=None):
+        """(transactions newest first, next cursor) for one customer, or None
+        if the customer is unknown. See TransactionIndex.query."""
+        self.refresh()
+        with self.lock:
+            c = self._customer(customer_id)
+            if c is None:
+                return None
+            index = self._tx_indexes.get(customer_id)
+            if index is None:
+                index = self._tx_indexes[customer_id] = TransactionIndex(c.get("transactions", []))
+            return index.query(limit, cursor, since, until, counterparty)
+
+    def by_customer_id(self, customer_id):
+        self.refresh()
+        return self._customer(customer_id)
+
+    def by_account_id(self, account_id):
+        self.refresh()
+        return self._account(account_id)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(data_path):
+    """Return the process-wide store for `data_path`, loading it on first use."""
+    with _stores_lock:
+        store = _stores.get(data_path)
+        if store is None:
+            store = CustomerStore(data_path)
+            store.load()
+            _stores[data_path] = store
+        return store
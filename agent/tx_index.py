@@ -0,0 +1,103 @@
+# tx_index.py
+import bisect
+
+_TRANSFER_PREFIXES = ("Transfer to ", "Transfer from ")
+
+
+def counterparty_of(tx):
+    """Counterparty of a transaction; ledger transfers only name it in the description."""
+    if tx.get("counterparty"):
+        return tx["counterparty"]
+    desc = tx.get("description", "")
+    for prefix in _TRANSFER_PREFIXES:
+        if desc.startswith(prefix):
+            return desc[len(prefix):]
+    return None
+
+
+class _Sorted:
+    """Transactions sorted by (date, arrival order), with parallel key list for bisect."""
+
+    __slots__ = ("keys", "txs")
+
+    def __init__(self):
+        self.keys = []
+        self.txs = []
+
+    def add(self, key, tx):
+        if not self.keys or key >= self.keys[-1]:
+            # New transactions are almost always the latest: plain append
+            self.keys.append(key)
+            self.txs.append(tx)
+        else:
+            i = bisect.bisect(self.keys, key)
+            self.keys.insert(i, key)
+            self.txs.insert(i, tx)
+
+    def newest_first(self, limit, before=None, since=None, until=None):
+        """Up to `limit` transactions, newest first, strictly older than the
+        `before` key and within the [since, until] date range."""
+        hi = len(self.keys)
+        if until is not None:
+            hi = bisect.bisect(self.keys, (until, float("inf")))
+        if before is not None:
+            hi = min(hi, bisect.bisect_left(self.keys, before))
+        lo = bisect.bisect_left(self.keys, (since, -1)) if since is not None else 0
+        lo = max(lo, hi - limit)
+        return self.keys[lo:hi][::-1], self.txs[lo:hi][::-1], lo > 0 and (
+            since is None or self.keys[lo - 1][0] >= since)
+
+
+class TransactionIndex:
+    """One customer's transactions kept sorted by date, newest-first queries.
+
+    Built once from the customer's `transactions` list and then appended to
+    as the ledger applies new entries, so "last n" costs O(log n + n_page)
+    however long the history is. Transactions with the same date keep their
+    arrival order (later = newer). Pages are continued with an opaque cursor
+    ("<date>:<order>" of the last transaction returned); cursors stay valid
+    across store reloads because arrival order is the list order.
+    """
+
+    def __init__(self, transactions=()):
+        self._all = _Sorted()
+        self._by_counterparty = {}
+        self._count = 0
+        for tx in transactions:
+            self.add(tx)
+
+    def __len__(self):
+        return self._count
+
+    def add(self, tx):
+        key = (tx.get("date") or "", self._count)
+        self._count += 1
+        self._all.add(key, tx)
+        cp = counterparty_of(tx)
+        if cp:
+            self._by_counterparty.setdefault(cp, _Sorted()).add(key, tx)
+
+    def query(self, limit, cursor=None, since=None, until=None, counterparty=None):
+        """Returns (transactions newest first, next cursor or None)."""
+        if counterparty is not None:
+            sorted_txs = self._by_counterparty.get(counterparty)
+            if sorted_txs is None:
+                return [], None
+        else:
+            sorted_txs = self._all
+        keys, txs, more = sorted_txs.newest_first(max(limit, 0), decode_cursor(cursor), since, until)
+        return txs, (encode_cursor(keys[-1]) if more and keys else None)
+
+
+def encode_cursor(key):
+    return f"{key[0]}:{key[1]}"
+
+
+def decode_cursor(cursor):
+    """(date, order) from a cursor string; ValueError if malformed."""
+    if not cursor:
+        return None
+    date, sep, order = str(cursor).rpartition(":")
+    if not sep:
+        raise ValueError(f"invalid cursor {cursor!r}")
+    return date, int(order)
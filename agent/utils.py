@@ -1,30 +1,152 @@
+import atexit
+import contextvars
 import json
 import logging
+import logging.handlers
 import os
+import queue
+import threading
+import time
+import uuid
 
-LOG_FILE = "/app/logs/agent.log"
+# One file per process: "{pid}" in LOG_FILE is replaced by the worker's pid
+LOG_FILE = os.environ.get("LOG_FILE", "/app/logs/agent.log").format(pid=os.getpid())
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+LOG_BACKUPS = int(os.environ.get("LOG_BACKUPS", "5"))
+LOG_FSYNC_INTERVAL = float(os.environ.get("LOG_FSYNC_INTERVAL", "1.0"))
 os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
 
-logging.basicConfig(
-    filename=LOG_FILE,
-    level=logging.INFO,
-    format="%(asctime)s | %(levelname)s | %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S"
-)
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+
+def new_request_id(incoming=None):
+    """Bind a request id (the caller's X-Request-ID, or a fresh one) to this context."""
+    rid = incoming or uuid.uuid4().hex[:16]
+    request_id_var.set(rid)
+    return rid
+
+
+class BatchingFileWriter(threading.Thread):
+    """Background writer draining the log queue.
+
+    Records are written as JSON lines in batches: one write + flush per
+    batch, one fsync per `fsync_interval` at most, and size-based rotation
+    (`path.1` ... `path.<backups>`). Callers only pay for a queue put.
+    """
+
+    def __init__(self, q, path, max_bytes, backups, fsync_interval, batch_size=512):
+        super().__init__(name="log-writer", daemon=True)
+        self.q = q
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.fsync_interval = fsync_interval
+        self.batch_size = batch_size
+        self._f = open(path, "a", encoding="utf-8")
+        self._dirty = False
+        self._last_sync = time.monotonic()
+
+    @staticmethod
+    def format(record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+                  + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "pid": record.process,
+            "request_id": getattr(record, "request_id", None),
+            "customer_id": getattr(record, "customer_id", None),
+            "msg": record.getMessage(),
+        }
+        return json.dumps(entry, default=str)
+
+    def run(self):
+        stop = False
+        while not stop:
+            try:
+                record = self.q.get(timeout=self.fsync_interval)
+            except queue.Empty:
+                self._sync()
+                continue
+            batch = [record]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.q.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                stop = True
+                batch = [r for r in batch if r is not None]
+            if batch:
+                self._write("".join(self.format(r) + "\n" for r in batch))
+            if stop or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+        self._f.close()
+
+    def _write(self, data):
+        if self.max_bytes and self._f.tell() + len(data) > self.max_bytes:
+            self._rotate()
+        self._f.write(data)
+        self._f.flush()
+        self._dirty = True
+
+    def _sync(self):
+        if self._dirty:
+            os.fsync(self._f.fileno())
+            self._dirty = False
+        self._last_sync = time.monotonic()
+
+    def _rotate(self):
+        self._sync()
+        self._f.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        self._f = open(self.path, "w" if not self.backups else "a", encoding="utf-8")
+
+    def stop(self):
+        self.q.put(None)
+        self.join(timeout=5)
+
+
+class _ContextFilter(logging.Filter):
+    # Runs in the caller's thread, where the request context is visible
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+_queue = queue.SimpleQueue()
+_writer = BatchingFileWriter(_queue, LOG_FILE, LOG_MAX_BYTES, LOG_BACKUPS, LOG_FSYNC_INTERVAL)
+_writer.start()
+atexit.register(_writer.stop)
+
+_handler = logging.handlers.QueueHandler(_queue)
+_handler.addFilter(_ContextFilter())
+logger = logging.getLogger("agent")
+logger.setLevel(logging.INFO)
+logger.addHandler(_handler)
+logger.propagate = False
+
 
 def log_event(entry, customer_id=None):
-    """Universal structured logger."""
-    prefix = f"[{customer_id}] " if customer_id else ""
+    """Universal structured logger (JSON lines, written off the request path)."""
     if isinstance(entry, dict):
         msg = json.dumps(entry, default=str)
     else:
         msg = str(entry)
-    logging.info(prefix + msg)
+    logger.info(msg, extra={"customer_id": customer_id})
 
 def load_data(data_path):
     with open(data_path, "r") as f:
         return json.load(f)
 
 def save_data(data_path, data):
-    with open(data_path, "w") as f:
+    """Atomically replace the data file (write temp file, fsync, rename)."""
+    tmp = data_path + ".tmp"
+    with open(tmp, "w") as f:
         json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, data_path)
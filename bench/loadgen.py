@@ -0,0 +1,177 @@
+# loadgen.py
+"""Open-loop async load generator for the agent stack.
+
+Replays prompts from JSON-lines files (one {"prompt": ...} object per line)
+and/or promptfoo YAML configs (`tests[].vars.prompt`, e.g. redteam.yaml)
+against the agent /chat, the LLM proxy /generate and the fraud /predict
+endpoints. Requests are started on a fixed schedule at the target RPS,
+regardless of how fast earlier ones finish, so queueing shows up in the
+latency percentiles instead of silently lowering the offered load.
+
+    python loadgen.py --rps 20 --duration 30 --targets chat,generate,predict \\
+        --prompts ../redteam.yaml --save results/current.json \\
+        --baseline results/baseline.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sys
+import time
+
+import httpx
+import yaml
+
+import report
+
+DEFAULT_URLS = {
+    "chat": "http://localhost:5003/chat",
+    "generate": "http://localhost:5002/generate",
+    "predict": "http://localhost:5001/predict",
+}
+FALLBACK_PROMPTS = [
+    "What is my balance?",
+    "Show my last 3 transactions",
+    "Show my profile",
+    "Transfer 25 from CUST001 to CUST002",
+]
+
+
+def load_prompts(paths):
+    prompts = []
+    for path in paths:
+        if path.endswith((".yaml", ".yml")):
+            with open(path) as f:
+                cfg = yaml.safe_load(f) or {}
+            for test in cfg.get("tests") or []:
+                prompt = (test.get("vars") or {}).get("prompt")
+                if prompt:
+                    prompts.append(str(prompt))
+        else:
+            with open(path) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        obj = json.loads(line)
+                    except ValueError:
+                        continue
+                    if isinstance(obj, dict) and obj.get("prompt"):
+                        prompts.append(str(obj["prompt"]))
+    return prompts or FALLBACK_PROMPTS
+
+
+def load_tokens(data_path, explicit):
+    if explicit:
+        return explicit
+    try:
+        with open(data_path) as f:
+            return [c["auth_token_b64"] for c in json.load(f)["customers"]]
+    except (OSError, ValueError, KeyError):
+        return ["VGVzdEAx"]
+
+
+class Workload:
+    """Builds the next request for each endpoint, deterministically from `seed`."""
+
+    def __init__(self, prompts, tokens, seed=0):
+        self.rng = random.Random(seed)
+        self.prompts = itertools.cycle(prompts)
+        self.tokens = itertools.cycle(tokens)
+
+    def request(self, target):
+        if target == "chat":
+            return {"json": {"prompt": next(self.prompts)},
+                    "headers": {"Authorization": f"Basic {next(self.tokens)}"}}
+        if target == "generate":
+            return {"json": {"prompt": next(self.prompts)}}
+        return {"json": {"features": [round(self.rng.gauss(0, 1), 4) for _ in range(5)]}}
+
+
+async def fire(client, target, url, req, samples, slots):
+    if slots.locked():
+        # Client-side cap hit: record the drop instead of queueing (keeps the load
+        # open-loop); no latency, so it stays out of the percentiles
+        samples[target].append((None, None, "client_overloaded"))
+        return
+    async with slots:
+        t0 = time.perf_counter()
+        try:
+            r = await client.post(url, **req)
+            await r.aread()
+            status, err = r.status_code, None
+        except httpx.TimeoutException:
+            status, err = None, "timeout"
+        except httpx.HTTPError as e:
+            status, err = None, type(e).__name__
+        samples[target].append((time.perf_counter() - t0, status, err))
+
+
+async def run(args):
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    urls = {t: getattr(args, f"{t}_url") for t in targets}
+    workload = Workload(load_prompts(args.prompts), load_tokens(args.data, args.token), args.seed)
+    samples = {t: [] for t in targets}
+    slots = asyncio.Semaphore(args.max_in_flight)
+    limits = httpx.Limits(max_connections=args.max_in_flight,
+                          max_keepalive_connections=args.max_in_flight)
+    total = int(args.rps * args.duration)
+    interval = 1.0 / args.rps
+
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        # Round-robin over targets so each gets rps / len(targets)
+        tasks = []
+        start = time.perf_counter()
+        for i in range(total):
+            delay = start + i * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            target = targets[i % len(targets)]
+            tasks.append(asyncio.create_task(
+                fire(client, target, urls[target], workload.request(target), samples, slots)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    results = {t: report.summarize(s, elapsed) for t, s in samples.items()}
+    config = {"rps": args.rps, "duration": args.duration, "targets": targets,
+              "prompts": args.prompts, "max_in_flight": args.max_in_flight, "seed": args.seed}
+    return report.make_run(results, config)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Async load generator for /chat, /generate, /predict")
+    ap.add_argument("--targets", default="chat", help="comma list of chat,generate,predict")
+    ap.add_argument("--rps", type=float, default=10.0, help="total offered requests per second")
+    ap.add_argument("--duration", type=float, default=30.0, help="seconds")
+    ap.add_argument("--prompts", action="append", default=[],
+                    help="prompt source (.jsonl or promptfoo .yaml); repeatable")
+    ap.add_argument("--data", default=os.path.join(os.path.dirname(__file__), "..", "data",
+                                                   "customers_transactions.json"),
+                    help="customer data file to take /chat tokens from")
+    ap.add_argument("--token", action="append", default=[], help="Basic token(s) for /chat")
+    ap.add_argument("--max-in-flight", type=int, default=256)
+    ap.add_argument("--timeout", type=float, default=60.0)
+    ap.add_argument("--seed", type=int, default=0)
+    for name, url in DEFAULT_URLS.items():
+        ap.add_argument(f"--{name}-url", default=url)
+    ap.add_argument("--save", help="write results JSON here")
+    ap.add_argument("--baseline", help="compare against this results JSON")
+    ap.add_argument("--tolerance", type=float, default=0.10)
+    args = ap.parse_args()
+
+    result = asyncio.run(run(args))
+    report.print_run(result)
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        report.save(result, args.save)
+    if args.baseline and os.path.exists(args.baseline):
+        print()
+        if report.compare(report.load(args.baseline), result, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
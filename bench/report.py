@@ -0,0 +1,140 @@
+# report.py
+"""Benchmark summaries: percentiles, baselines and run-to-run comparison.
+
+    python report.py results/current.json                     # print a saved run
+    python report.py results/current.json --baseline results/baseline.json
+"""
+import argparse
+import json
+import math
+import subprocess
+import sys
+import time
+
+# Metrics where a higher value is a regression (everything but throughput)
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms", "mean_ms", "error_rate", "drop_rate")
+# Compared as absolute differences rather than relative ones
+RATES = ("error_rate", "drop_rate")
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def summarize(samples, elapsed):
+    """samples: [(latency_s, status_code or None, error or None)] for one endpoint.
+
+    Requests the client dropped at its in-flight cap have latency None; they
+    are counted as `dropped` and kept out of latency, throughput and errors.
+    """
+    sent = [s for s in samples if s[0] is not None]
+    dropped = len(samples) - len(sent)
+    lat = sorted(s[0] * 1000 for s in sent)
+    errors = {}
+    for _, status, err in sent:
+        if err or status is None or status >= 400:
+            key = err or f"http_{status}"
+            errors[key] = errors.get(key, 0) + 1
+    n = len(sent)
+    n_err = sum(errors.values())
+    return {
+        "requests": n,
+        "dropped": dropped,
+        "throughput_rps": round(n / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(lat, 50), 2),
+        "p95_ms": round(percentile(lat, 95), 2),
+        "p99_ms": round(percentile(lat, 99), 2),
+        "mean_ms": round(sum(lat) / n, 2) if n else 0.0,
+        "max_ms": round(lat[-1], 2) if lat else 0.0,
+        "error_rate": round(n_err / n, 4) if n else 0.0,
+        "drop_rate": round(dropped / len(samples), 4) if samples else 0.0,
+        "errors": errors,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_run(results, config):
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "commit": git_commit(),
+        "config": config,
+        "results": results,
+    }
+
+
+def save(run, path):
+    with open(path, "w") as f:
+        json.dump(run, f, indent=2)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def print_run(run):
+    print(f"run {run.get('created')} commit={run.get('commit')}")
+    print(f"{'endpoint':<10} {'reqs':>7} {'dropped':>8} {'rps':>8} {'p50':>9} {'p95':>9} "
+          f"{'p99':>9} {'err%':>7}")
+    for name, r in run["results"].items():
+        print(f"{name:<10} {r['requests']:>7} {r.get('dropped', 0):>8} {r['throughput_rps']:>8} "
+              f"{r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9} {r['error_rate'] * 100:>6.2f}%")
+        for err, count in sorted(r["errors"].items(), key=lambda kv: -kv[1])[:5]:
+            print(f"{'':<10}   {count:>6} x {err}")
+
+
+def compare(baseline, current, tolerance=0.10):
+    """Print per-metric deltas; returns the list of regressions beyond `tolerance`."""
+    regressions = []
+    print(f"baseline commit={baseline.get('commit')}  current commit={current.get('commit')}")
+    for name, cur in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name}: no baseline")
+            continue
+        for metric in ("throughput_rps",) + LOWER_IS_BETTER:
+            # Runs saved before drop_rate existed count as no drops
+            b, c = base.get(metric, 0.0), cur.get(metric, 0.0)
+            delta = (c - b) / b if b else (0.0 if c == b else math.inf)
+            worse = -delta if metric == "throughput_rps" else delta
+            flag = ""
+            # Error/drop rates are compared absolutely, latencies/throughput relatively
+            if metric in RATES:
+                if c - b > 0.01:
+                    flag = "  REGRESSION"
+            elif worse > tolerance:
+                flag = "  REGRESSION"
+            if flag:
+                regressions.append((name, metric, b, c))
+            print(f"{name:<10} {metric:<15} {b:>10} -> {c:<10} ({delta:+.1%}){flag}")
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Print or compare benchmark runs")
+    ap.add_argument("run", help="results JSON written by loadgen.py")
+    ap.add_argument("--baseline", help="results JSON to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.10,
+                    help="allowed relative slowdown before flagging (default 10%%)")
+    args = ap.parse_args()
+    run = load(args.run)
+    print_run(run)
+    if args.baseline:
+        print()
+        if compare(load(args.baseline), run, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
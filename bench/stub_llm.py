@@ -0,0 +1,101 @@
+# stub_llm.py
+"""Deterministic stand-in for the LLM proxy (/generate), stdlib only.
+
+Answers with the action JSON the banking agent expects, chosen from
+keywords in the prompt by the llm service's offline rules
+(llm/offline_backend.py), so benchmark runs need no Ollama and produce the
+same output for the same prompt. Latency is simulated as a fixed base
+plus a per-token delay (seeded by the prompt, so it is repeatable too).
+
+    python stub_llm.py --port 5002 --latency-ms 50 --tokens-per-sec 200
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Same keyword rules as the llm service's offline backend
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "llm"))
+from offline_backend import rule_output  # noqa: E402
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    tokens_per_sec = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, ctype="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            return self._send(200, b'{"status": "ok"}')
+        self._send(404, b'{"error": "not found"}')
+
+    def do_POST(self):
+        if self.path != "/generate":
+            return self._send(404, b'{"error": "not found"}')
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._send(400, b'{"error": "invalid JSON"}')
+        prompt = str(payload.get("prompt", ""))
+        output = rule_output(prompt)
+
+        # Simulated generation time: base latency + ~4 chars per token
+        jitter = int(hashlib.sha256(prompt.encode()).hexdigest()[:4], 16) / 0xFFFF
+        delay = self.latency * (0.8 + 0.4 * jitter)
+        if self.tokens_per_sec:
+            delay += len(output) / 4 / self.tokens_per_sec
+
+        if payload.get("stream"):
+            return self._stream(output, delay)
+        time.sleep(delay)
+        self._send(200, json.dumps({"output": output}).encode())
+
+    def _stream(self, output, delay):
+        # Same NDJSON framing as the proxy: {"output": <chunk>, "done": bool}
+        chunks = [output[i:i + 8] for i in range(0, len(output), 8)] or [""]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, chunk in enumerate(chunks):
+            time.sleep(delay / len(chunks))
+            line = json.dumps({"output": chunk, "done": i == len(chunks) - 1}).encode() + b"\n"
+            try:
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+            except (BrokenPipeError, ConnectionResetError):
+                return
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=5002)
+    ap.add_argument("--latency-ms", type=float, default=50.0, help="base response latency")
+    ap.add_argument("--tokens-per-sec", type=float, default=0.0,
+                    help="simulated generation speed (0 = instant)")
+    args = ap.parse_args()
+    Handler.latency = args.latency_ms / 1000
+    Handler.tokens_per_sec = args.tokens_per_sec
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    print(f"stub LLM on {args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# batcher.py
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatcher:
+    """Merges concurrent single-row predictions into one vectorized call.
+
+    `submit(row)` enqueues a feature vector and returns a Future. A worker
+    thread takes the first waiting row, keeps collecting for up to
+    `max_wait` seconds (or until `max_batch` rows), stacks them and calls
+    `predict_fn(X)` once, then resolves every Future with its own row's
+    result.
+    """
+
+    def __init__(self, predict_fn, max_batch=64, max_wait=0.002):
+        self.predict_fn = predict_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, name="fraud-batcher", daemon=True).start()
+
+    def submit(self, row):
+        fut = Future()
+        self._queue.put((np.asarray(row, dtype=float).reshape(-1), fut))
+        return fut
+
+    def predict(self, row, timeout=None):
+        return self.submit(row).result(timeout)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            try:
+                while len(batch) < self.max_batch:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                pass
+
+            try:
+                X = np.vstack([row for row, _ in batch])
+                results = self.predict_fn(X)
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            for (_, fut), res in zip(batch, results):
+                fut.set_result(res)
@@ -0,0 +1,75 @@
+# bench_inference.py
+"""Compare sklearn and compiled-forest inference for the fraud model.
+
+Checks that both backends return identical probabilities, also for rows
+with missing (NaN) features, then reports
+single-row p50/p99 latency and batch throughput.
+
+    python bench_inference.py [--rows 1000] [--batch 1 64 1024 8192]
+"""
+import argparse
+import os
+import time
+
+import joblib
+import numpy as np
+
+from compiled_forest import CompiledForest
+from train_and_serve_fraud_model import MODEL_PATH, make_data, train
+
+
+def single_row_latency(fn, X, repeats):
+    samples = []
+    for i in range(repeats):
+        row = X[i % len(X)].reshape(1, -1)
+        t0 = time.perf_counter()
+        fn(row)
+        samples.append(time.perf_counter() - t0)
+    samples = np.asarray(samples) * 1e6
+    return np.percentile(samples, 50), np.percentile(samples, 99)
+
+
+def batch_throughput(fn, X, batch, min_time=0.5):
+    Xb = X[np.arange(batch) % len(X)]
+    n, t0 = 0, time.perf_counter()
+    while time.perf_counter() - t0 < min_time:
+        fn(Xb)
+        n += batch
+    return n / (time.perf_counter() - t0)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--rows", type=int, default=1000)
+    ap.add_argument("--batch", type=int, nargs="+", default=[1, 64, 1024, 8192])
+    args = ap.parse_args()
+
+    if not os.path.exists(MODEL_PATH):
+        train()
+    model = joblib.load(MODEL_PATH)
+    compiled = CompiledForest.from_sklearn(model)
+    X, _ = make_data(max(args.rows, max(args.batch)))
+
+    # Missing features reach the model as NaN (null over HTTP); blank one per row in a copy
+    Xnan = X.copy()
+    Xnan[np.arange(len(X)), np.arange(len(X)) % X.shape[1]] = np.nan
+    Xcheck = np.vstack([X, Xnan])
+    ref = model.predict_proba(Xcheck)
+    got = compiled.predict_proba(Xcheck)
+    print(f"equal to sklearn: {np.array_equal(ref, got)} "
+          f"(max abs diff {np.abs(ref - got).max():.3g})")
+
+    backends = {"sklearn": model.predict_proba, "compiled": compiled.predict_proba}
+    print(f"\n{'backend':<10} {'p50 us':>10} {'p99 us':>10}")
+    for name, fn in backends.items():
+        p50, p99 = single_row_latency(fn, X, args.rows)
+        print(f"{name:<10} {p50:>10.1f} {p99:>10.1f}")
+
+    print(f"\n{'backend':<10} {'batch':>7} {'rows/s':>12}")
+    for name, fn in backends.items():
+        for b in args.batch:
+            print(f"{name:<10} {b:>7} {batch_throughput(fn, X, b):>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
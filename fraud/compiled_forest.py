@@ -0,0 +1,114 @@
+# compiled_forest.py
+import numpy as np
+import sklearn
+from packaging.version import Version
+
+# sklearn < 1.4 stores class counts in tree_.value and normalizes them in
+# predict_proba; from 1.4 on the stored values are already fractions and
+# are returned as-is. Mirror whichever applies so results stay bit-equal.
+_NORMALIZE_LEAVES = Version(sklearn.__version__).release[:2] < (1, 4)
+
+
+class CompiledForest:
+    """A fitted RandomForestClassifier flattened into NumPy arrays.
+
+    All trees share one node table (children, feature, threshold, where a
+    missing value goes and the per-node class distribution), with leaves
+    pointing at themselves. A
+    prediction walks every (row, tree) pair one level per step, `depth`
+    vectorized steps in total, instead of going through sklearn's per-call
+    validation and per-tree dispatch.
+
+    Probabilities match sklearn exactly: inputs are cast to float32 like
+    sklearn's trees do, NaN follows each node's missing_go_to_left, leaf
+    distributions are taken the same way, and the
+    per-tree results are summed in tree order before dividing by the
+    number of trees.
+    """
+
+    def __init__(self, left, right, feature, threshold, missing_left, value, roots, depth,
+                 classes):
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.missing_left = missing_left
+        self.value = value
+        self.roots = roots
+        self.depth = depth
+        self.classes_ = classes
+
+    @classmethod
+    def from_sklearn(cls, model):
+        lefts, rights, features, thresholds, missing, values, roots = [], [], [], [], [], [], []
+        offset, depth = 0, 0
+        for est in model.estimators_:
+            t = est.tree_
+            n = t.node_count
+            idx = np.arange(n)
+            leaf = t.children_left == -1
+            lefts.append(np.where(leaf, idx, t.children_left) + offset)
+            rights.append(np.where(leaf, idx, t.children_right) + offset)
+            features.append(np.where(leaf, 0, t.feature))
+            thresholds.append(t.threshold)
+            # sklearn < 1.3 has no missing-value support: NaN fails `<=` and goes right
+            missing.append(getattr(t, "missing_go_to_left", np.zeros(n, dtype=np.uint8)))
+            v = t.value[:, 0, :].astype(np.float64)
+            if _NORMALIZE_LEAVES:
+                norm = v.sum(axis=1, keepdims=True)
+                norm[norm == 0.0] = 1.0
+                v = v / norm
+            values.append(v)
+            roots.append(offset)
+            depth = max(depth, t.max_depth)
+            offset += n
+        return cls(
+            np.concatenate(lefts).astype(np.intp),
+            np.concatenate(rights).astype(np.intp),
+            np.concatenate(features).astype(np.intp),
+            np.concatenate(thresholds).astype(np.float64),
+            np.concatenate(missing).astype(bool),
+            np.concatenate(values),
+            np.asarray(roots, dtype=np.intp),
+            depth,
+            np.asarray(model.classes_),
+        )
+
+    def apply(self, X):
+        """Global leaf index for every (row, tree); shape (n_rows, n_trees)."""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        rows = np.arange(X.shape[0])[:, None]
+        node = np.broadcast_to(self.roots, (X.shape[0], self.roots.shape[0])).copy()
+        has_nan = np.isnan(X).any()
+        for _ in range(self.depth):
+            x = X[rows, self.feature[node]]
+            go_left = x <= self.threshold[node]
+            if has_nan:
+                go_left |= np.isnan(x) & self.missing_left[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        return node
+
+    def predict_proba(self, X):
+        leaves = self.apply(X)
+        proba = np.zeros((leaves.shape[0], self.value.shape[1]))
+        for t in range(leaves.shape[1]):
+            proba += self.value[leaves[:, t]]
+        proba /= leaves.shape[1]
+        return proba
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    # ---- Artifact ----
+    def save(self, path):
+        np.savez(path, left=self.left, right=self.right, feature=self.feature,
+                 threshold=self.threshold, missing_left=self.missing_left,
+                 value=self.value, roots=self.roots, depth=self.depth, classes=self.classes_)
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        a = np.load(path, mmap_mode=mmap_mode)
+        return cls(a["left"], a["right"], a["feature"], a["threshold"], a["missing_left"],
+                   a["value"], a["roots"], int(a["depth"]), a["classes"])
@@ -0,0 +1,47 @@
+# model_cache.py
+import os
+import threading
+import time
+
+import joblib
+
+
+class ModelCache:
+    """Keeps the fraud model resident and hot-reloads it when the file changes.
+
+    The file is stat()'ed at most every `check_interval` seconds; the model
+    is only deserialized again when its mtime/size changed. With
+    `mmap_mode="r"` the tree arrays are memory-mapped rather than copied,
+    so several server processes share the same pages. `transform` is
+    applied to each freshly loaded model (e.g. compiling it).
+    """
+
+    def __init__(self, path, mmap_mode="r", check_interval=1.0, transform=None):
+        self.path = path
+        self.mmap_mode = mmap_mode
+        self.transform = transform
+        self.check_interval = check_interval
+        self._model = None
+        self.loads = 0
+        self._stamp = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def _file_stamp(self):
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def get(self):
+        now = time.monotonic()
+        if self._model is not None and now - self._checked < self.check_interval:
+            return self._model
+        with self._lock:
+            self._checked = now
+            stamp = self._file_stamp()
+            if stamp != self._stamp:
+                model = joblib.load(self.path, mmap_mode=self.mmap_mode)
+                self._model = self.transform(model) if self.transform else model
+                self._stamp = stamp
+                self.loads += 1
+                print(f"model loaded from {self.path}")
+            return self._model
@@ -0,0 +1,212 @@
+# robustness_eval.py
+"""Adversarial-robustness curve for the fraud model.
+
+Attacks every row of the make_data() set in vectorized batches, for several
+L-inf budgets (eps), and reports model accuracy against eps per attack:
+
+  fgm     transfer FGSM: sign of the loss gradient of a logistic-regression
+          surrogate fitted to the forest's own predictions (forests have no
+          gradient), applied to the forest
+  random  random sign noise of size eps (baseline)
+  hsj     ART HopSkipJump, decision-based; run once on a subsample, a row
+          counts as broken at eps if its adversarial example is within eps
+
+Batches are spread over a process pool. Results are cached per model file
+hash (and data size / seed / eps, plus batch size for random and the attack
+settings for hsj), so after a retrain only the new model is
+evaluated and repeated runs return immediately.
+
+    python robustness_eval.py [--eps 0 0.1 0.2 0.3 0.5 1.0] [--attacks fgm random hsj]
+                              [--workers 4] [--batch 512] [--out curve.json]
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+
+from train_and_serve_fraud_model import MODEL_PATH, make_data, train
+
+CACHE_PATH = "robustness_cache.json"
+ATTACKS = ("fgm", "random", "hsj")
+
+_model = None
+
+
+def _load_model(path):
+    global _model
+    _model = joblib.load(path, mmap_mode="r")
+
+
+def model_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()[:16]
+
+
+def fit_surrogate(model, X):
+    """(w, b) of a logistic regression mimicking the forest's decisions."""
+    from sklearn.linear_model import LogisticRegression
+    surrogate = LogisticRegression().fit(X, model.predict(X))
+    return surrogate.coef_[0], surrogate.intercept_[0]
+
+
+# ---- Worker tasks (one batch, all eps values) ----
+
+def _correct_counts(X, y, eps_values, direction):
+    """Correct predictions on X + eps * direction for each eps."""
+    stacked = np.concatenate([X + eps * direction for eps in eps_values])
+    pred = _model.predict(stacked).reshape(len(eps_values), len(X))
+    return (pred == y).sum(axis=1).tolist()
+
+
+def fgm_batch(X, y, eps_values, w, b):
+    p = 1.0 / (1.0 + np.exp(-(X @ w + b)))
+    # d(log loss)/dx = (p - y) * w for logistic regression
+    direction = np.sign((p - y)[:, None] * w[None, :])
+    return _correct_counts(X, y, eps_values, direction)
+
+
+def random_batch(X, y, eps_values, seed):
+    direction = np.random.RandomState(seed).choice([-1.0, 1.0], size=X.shape)
+    return _correct_counts(X, y, eps_values, direction)
+
+
+def hsj_batch(X, y, eps_values, max_iter, max_eval, init_eval):
+    from art.attacks.evasion import HopSkipJump
+    from art.estimators.classification.scikitlearn import ScikitlearnClassifier
+    clf = ScikitlearnClassifier(model=_model)
+    attack = HopSkipJump(classifier=clf, norm=np.inf, max_iter=max_iter, max_eval=max_eval,
+                         init_eval=init_eval, verbose=False)
+    pred = _model.predict(X)
+    X_adv = attack.generate(X.astype(np.float32)).astype(float)
+    broken = _model.predict(X_adv) != y
+    distance = np.abs(X_adv - X).max(axis=1)
+    return [int(((pred == y) & ~(broken & (distance <= eps))).sum()) for eps in eps_values]
+
+
+# ---- Cache ----
+
+class ResultCache:
+    """{model hash: {"<attack>|n=..|seed=..|eps=..": {"correct", "n"}}} in one JSON file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    def get(self, model_key, key):
+        return self.entries.get(model_key, {}).get(key)
+
+    def put(self, model_key, key, value):
+        self.entries.setdefault(model_key, {})[key] = value
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f, indent=1)
+        os.replace(tmp, self.path)
+
+
+def run_attack(pool, attack, X, y, eps_values, args, surrogate):
+    """{eps: correct count} for one attack, batches run on the pool."""
+    if attack == "hsj":
+        idx = np.random.RandomState(args.seed).permutation(len(X))[:args.hsj_rows]
+        X, y = X[idx], y[idx]
+        batch = max(1, len(X) // max(args.workers, 1))
+    else:
+        batch = args.batch
+    futures = []
+    for i, start in enumerate(range(0, len(X), batch)):
+        Xb, yb = X[start:start + batch], y[start:start + batch]
+        if attack == "fgm":
+            futures.append(pool.submit(fgm_batch, Xb, yb, eps_values, *surrogate))
+        elif attack == "random":
+            futures.append(pool.submit(random_batch, Xb, yb, eps_values, args.seed + i))
+        else:
+            futures.append(pool.submit(hsj_batch, Xb, yb, eps_values, args.hsj_iter,
+                                       args.hsj_max_eval, args.hsj_init_eval))
+    totals = np.zeros(len(eps_values), dtype=int)
+    for f in futures:
+        totals += f.result()
+    return dict(zip(eps_values, totals.tolist())), len(X)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Batched adversarial-robustness evaluation")
+    ap.add_argument("--model", default=MODEL_PATH)
+    ap.add_argument("--rows", type=int, default=2000, help="make_data() size")
+    ap.add_argument("--eps", type=float, nargs="+", default=[0.0, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0])
+    ap.add_argument("--attacks", nargs="+", choices=ATTACKS, default=["fgm", "random"])
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--batch", type=int, default=512, help="rows per task (fgm/random)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--hsj-rows", type=int, default=200, help="subsample for HopSkipJump")
+    ap.add_argument("--hsj-iter", type=int, default=20)
+    ap.add_argument("--hsj-max-eval", type=int, default=1000)
+    ap.add_argument("--hsj-init-eval", type=int, default=50)
+    ap.add_argument("--cache", default=CACHE_PATH)
+    ap.add_argument("--no-cache", action="store_true", help="recompute everything")
+    ap.add_argument("--out", help="write the curve as JSON")
+    args = ap.parse_args()
+
+    if not os.path.exists(args.model):
+        train()
+    mhash = model_hash(args.model)
+    X, y = make_data(args.rows)
+    cache = ResultCache(args.cache)
+    eps_values = sorted(set(args.eps))
+    print(f"model {args.model} sha256:{mhash}  rows {len(X)}  workers {args.workers}")
+
+    curve = {}
+    with ProcessPoolExecutor(args.workers, initializer=_load_model,
+                             initargs=(args.model,)) as pool:
+        surrogate = None
+        for attack in args.attacks:
+            params = f"n={args.rows}|seed={args.seed}"
+            if attack == "hsj":
+                params += (f"|rows={args.hsj_rows}|iter={args.hsj_iter}"
+                           f"|eval={args.hsj_max_eval}|init={args.hsj_init_eval}")
+            elif attack == "random":
+                # noise is seeded per batch, so the batch size changes the result
+                params += f"|batch={args.batch}"
+            keys = {eps: f"{attack}|{params}|eps={eps:g}" for eps in eps_values}
+            results = {} if args.no_cache else \
+                {eps: cache.get(mhash, k) for eps, k in keys.items() if cache.get(mhash, k)}
+            todo = [eps for eps in eps_values if eps not in results]
+            seconds = 0.0
+            if todo:
+                if attack == "fgm" and surrogate is None:
+                    surrogate = fit_surrogate(joblib.load(args.model), X)
+                t0 = time.perf_counter()
+                correct, n = run_attack(pool, attack, X, y, todo, args, surrogate)
+                seconds = time.perf_counter() - t0
+                for eps in todo:
+                    results[eps] = {"correct": correct[eps], "n": n}
+                    cache.put(mhash, keys[eps], results[eps])
+                cache.save()
+            curve[attack] = {f"{eps:g}": results[eps]["correct"] / results[eps]["n"]
+                             for eps in eps_values}
+            # hsj runs once for all eps; the others evaluate every eps separately
+            rows = sum(results[eps]["n"] for eps in todo[:1 if attack == "hsj" else None])
+            rate = f"{rows / seconds:,.0f} adv rows/s" if seconds else "cached"
+            print(f"\n{attack}: {len(todo)} eps computed in {seconds:.2f}s ({rate})")
+            for eps in eps_values:
+                acc = curve[attack][f"{eps:g}"]
+                print(f"  eps {eps:<6g} acc {acc:6.3f} {'#' * int(acc * 40)}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"model_sha256": mhash, "rows": args.rows, "curve": curve}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
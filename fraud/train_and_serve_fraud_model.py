@@ -1,12 +1,46 @@
 # train_and_serve_fraud_model.py
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier
 import joblib
 import os
 
+from model_cache import ModelCache
+from batcher import MicroBatcher
+from compiled_forest import CompiledForest
+from prometheus_client import Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import CounterMetricFamily
+
 app = Flask(__name__)
 MODEL_PATH = "fraud_model.joblib"
+N_FEATURES = 5
+
+# Inference backend: "sklearn" or "compiled" (flattened NumPy forest)
+FRAUD_BACKEND = os.environ.get("FRAUD_BACKEND", "sklearn").lower()
+
+# Resident model (memory-mapped, hot-reloaded when the file changes)
+models = ModelCache(
+    MODEL_PATH,
+    mmap_mode=os.environ.get("MODEL_MMAP", "r") or None,
+    transform=CompiledForest.from_sklearn if FRAUD_BACKEND == "compiled" else None,
+)
+
+# ---- Prometheus metrics ----
+REQUEST_SECONDS = Histogram("fraud_request_seconds", "Prediction endpoint latency", ["endpoint"],
+                            buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1))
+INFERENCE_SECONDS = Histogram("fraud_inference_seconds", "Model predict_proba call duration",
+                              buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.1))
+BATCH_ROWS = Histogram("fraud_batch_rows", "Rows per predict_proba call",
+                       buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 1024))
+
+
+class ModelLoadsCollector:
+    def collect(self):
+        yield CounterMetricFamily("fraud_model_loads", "Model (re)loads from disk",
+                                  value=models.loads)
+
+
+REGISTRY.register(ModelLoadsCollector())
 
 def make_data(n=2000):
     rng = np.random.RandomState(0)
@@ -21,15 +55,55 @@ def train():
     joblib.dump(m, MODEL_PATH)
     print("model saved")
 
+def predict_proba(X):
+    """Fraud probability for each row of X, in one vectorized call."""
+    BATCH_ROWS.observe(len(X))
+    with INFERENCE_SECONDS.time():
+        return models.get().predict_proba(X)[:, 1]
+
+# Concurrent single-row /predict calls are merged into one predict_proba call
+batcher = MicroBatcher(
+    predict_proba,
+    max_batch=int(os.environ.get("BATCH_MAX_SIZE", "64")),
+    max_wait=float(os.environ.get("BATCH_MAX_WAIT_MS", "2")) / 1000,
+)
+
+def parse_features(data):
+    X = np.asarray(data, dtype=float)
+    if X.ndim == 1:
+        X = X.reshape(1, -1)
+    if X.ndim != 2 or X.shape[1] != N_FEATURES:
+        raise ValueError(f"expected rows of {N_FEATURES} features")
+    return X
+
 @app.route("/predict", methods=["POST"])
+@REQUEST_SECONDS.labels("predict").time()
 def predict():
-    data = request.json.get("features")
-    X = np.array(data).reshape(1, -1)
-    m = joblib.load(MODEL_PATH)
-    prob = float(m.predict_proba(X)[0,1])
+    try:
+        X = parse_features(request.json.get("features"))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    if len(X) != 1:
+        return jsonify({"error": "expected one row of features, use /predict_batch for several"}), 400
+    prob = float(batcher.predict(X[0], timeout=5))
     return jsonify({"fraud_prob": prob})
 
+@app.route("/predict_batch", methods=["POST"])
+@REQUEST_SECONDS.labels("predict_batch").time()
+def predict_batch():
+    try:
+        X = parse_features(request.json.get("features"))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    probs = predict_proba(X)
+    return jsonify({"fraud_prob": [float(p) for p in probs]})
+
+@app.route("/metrics")
+def metrics():
+    return Response(generate_latest(REGISTRY), mimetype=CONTENT_TYPE_LATEST)
+
 if __name__ == "__main__":
     if not os.path.exists(MODEL_PATH):
         train()
-    app.run(host="0.0.0.0", port=5001)
+    models.get()
+    app.run(host="0.0.0.0", port=5001, threaded=True)
@@ -0,0 +1,389 @@
+# train_pipeline.py
+"""Fraud-model training from the customer data file and its ledger.
+
+Transactions are read from the agent's data file (JSON, or a `.snap` file via
+agent/snapshot.py) plus its ledger journal (`<data>.ledger`, streamed line by
+line, entries newer than the file's ledger_seq), and turned into the same
+five features the agent's fraud_client computes at scoring time, for every
+outgoing transaction, as of just before it happened:
+
+    [amount z-score vs. earlier outgoing amounts (clipped to +-5),
+     2 x share of the balance moved, new counterparty,
+     outgoing transactions earlier the same day / 5, days since previous / 30]
+
+Features are computed with NumPy over chunks of customers at a time (segment
+cumulative sums, no per-transaction Python loop). The data has no fraud
+labels yet, so rows are labeled with make_data()'s rule (x0 + 0.5 x1 > 0.5);
+make_data() rows can be mixed in with --synthetic.
+
+Training modes:
+  full         fit a new forest on everything, trees built in parallel (n_jobs)
+  incremental  warm-start the published forest and add --trees-per-update
+               trees fitted on ledger rows newer than its watermark; falls back
+               to a full fit when there is no model, the ledger was compacted
+               past the watermark, or the forest would exceed --max-trees
+
+Each run writes models/fraud_model-v<N>.joblib plus a .json with its metadata,
+then atomically re-points fraud_model.joblib (a symlink) at it; the serving
+ModelCache notices the change and reloads. --rollback N re-points an older
+version. --report measures feature extraction, full fit, warm-start update
+time and peak memory on synthetic data of increasing size.
+
+    python train_pipeline.py --data ../data/customers_transactions.json [--mode incremental]
+    python train_pipeline.py --report 1000,10000,100000
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from train_and_serve_fraud_model import MODEL_PATH, make_data
+
+MODELS_DIR = "models"
+_VERSION = re.compile(r"fraud_model-v(\d+)\.joblib$")
+_DAY = np.datetime64("1970-01-01", "D")
+
+
+# ---- Reading ----
+
+def load_data(data_path):
+    """The data file as a JSON-style document; `.snap` files need agent/snapshot.py."""
+    if data_path.endswith(".snap"):
+        # Importable in a repo checkout; the fraud image does not ship the agent code
+        sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "agent"))
+        try:
+            from snapshot import load_any
+        except ImportError:
+            raise SystemExit(f"{data_path}: reading .snap data needs agent/snapshot.py; "
+                             f"convert it first: python snapshot.py {data_path} customers.json")
+        return load_any(data_path)
+    try:
+        with open(data_path) as f:
+            return json.load(f)
+    except ValueError as e:
+        raise SystemExit(f"{data_path}: not a JSON customer data file ({e})")
+
+
+def load_customers(data_path):
+    """(customers, snapshot seq) with ledger transfers applied, like the agent's store."""
+    data = load_data(data_path)
+    customers = data.get("customers", [])
+    snapshot_seq = data.get("ledger_seq", 0)
+    for c in customers:
+        for tx in c.get("transactions", []):
+            tx.setdefault("_seq", snapshot_seq)
+    by_id = {c.get("customer_id"): c for c in customers}
+    ledger = data_path + ".ledger"
+    if os.path.exists(ledger):
+        with open(ledger, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n") or not line.strip():
+                    continue
+                e = json.loads(line)
+                if e.get("type") != "transfer" or e["seq"] <= snapshot_seq:
+                    continue
+                src, dst = by_id.get(e["from"]), by_id.get(e["to"])
+                if src is None or dst is None:
+                    continue
+                src["account"]["balance"] -= e["amount"]
+                dst["account"]["balance"] += e["amount"]
+                src.setdefault("transactions", []).append(
+                    {"date": e["date"], "amount": -e["amount"],
+                     "description": f"Transfer to {e['to']}", "_seq": e["seq"]})
+                dst.setdefault("transactions", []).append(
+                    {"date": e["date"], "amount": e["amount"],
+                     "description": f"Transfer from {e['from']}", "_seq": e["seq"]})
+    return customers, snapshot_seq
+
+
+def _counterparty(tx):
+    # Same rule as fraud_client._History.observe
+    desc = tx.get("description", "")
+    if desc.startswith("Transfer to "):
+        return desc[len("Transfer to "):]
+    return tx.get("counterparty") or None
+
+
+# ---- Features ----
+
+def chunk_features(customers):
+    """(X, seq) for every outgoing transaction of `customers`, vectorized."""
+    lengths = np.array([len(c.get("transactions", [])) for c in customers], dtype=np.int64)
+    n = int(lengths.sum())
+    if n == 0:
+        return np.empty((0, 5)), np.empty(0, dtype=np.int64)
+    txs = [tx for c in customers for tx in c.get("transactions", [])]
+    amount = np.fromiter((float(tx.get("amount", 0) or 0) for tx in txs), float, n)
+    seq = np.fromiter((tx.get("_seq", 0) for tx in txs), np.int64, n)
+    dates = np.array([tx.get("date") or "NaT" for tx in txs], dtype="datetime64[D]")
+    day = np.where(np.isnat(dates), -1, (dates - _DAY).astype(np.int64))
+    codes = {}
+    cp = np.fromiter((-1 if k is None else codes.setdefault(k, len(codes))
+                      for k in map(_counterparty, txs)), np.int64, n)
+    balance = np.array([float(c.get("account", {}).get("balance", 0) or 0) for c in customers])
+
+    seg = np.repeat(np.arange(len(customers)), lengths)
+    starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    idx = np.arange(n)
+
+    def before(values):
+        """Sum of `values` over earlier transactions of the same customer."""
+        excl = np.cumsum(values) - values
+        return excl - excl[starts]
+
+    out = amount < 0
+    x = np.where(out, -amount, 0.0)
+    n_prev = before(out.astype(float))
+    s1, s2 = before(x), before(x * x)
+    mean = np.divide(s1, n_prev, out=np.zeros(n), where=n_prev > 0)
+    var = np.divide(s2 - s1 * mean, n_prev - 1, out=np.zeros(n), where=n_prev > 1)
+    std = np.sqrt(np.maximum(var, 0.0))
+    z = np.where(n_prev > 0, (x - mean) / np.maximum(std, 1.0), 0.0)
+
+    # Balance before the transaction: final balance minus everything from it on
+    seg_total = np.bincount(seg, weights=amount, minlength=len(customers))
+    balance_before = balance[seg] - (seg_total[seg] - before(amount))
+
+    # New counterparty: first occurrence of (customer, counterparty)
+    key = seg * (len(codes) + 1) + (cp + 1)
+    order = np.lexsort((idx, key))
+    first = np.ones(n, dtype=bool)
+    first[order[1:]] = key[order[1:]] != key[order[:-1]]
+    new_cp = np.where(cp < 0, 1.0, first.astype(float))
+
+    # Latest date seen before each transaction (fraud_client's last_date)
+    span = max(int(day.max()), 0) + 2
+    running = np.maximum.accumulate(seg * span + day + 1) - seg * span - 1
+    last_day = np.where(idx > starts, np.roll(running, 1), -1)
+
+    # Outgoing transactions earlier the same day (runs of equal day), counted
+    # only when the transaction is on the latest date, as at scoring time
+    run_start = np.ones(n, dtype=bool)
+    run_start[1:] = (seg[1:] != seg[:-1]) | (day[1:] != day[:-1])
+    run_first = np.maximum.accumulate(np.where(run_start, idx, 0))
+    excl = np.cumsum(out) - out
+    velocity = np.where(day == last_day, excl - excl[run_first], 0) / 5.0
+
+    idle = np.where((last_day < 0) | (day < 0), 30.0, np.clip(day - last_day, 0, 30))
+
+    X = np.column_stack([np.clip(z, -5.0, 5.0), 2.0 * x / np.maximum(balance_before, 1.0),
+                         new_cp, velocity, idle / 30.0])
+    return X[out], seq[out]
+
+
+def label(X):
+    return (X[:, 0] + 0.5 * X[:, 1] > 0.5).astype(int)
+
+
+def iter_chunks(customers, chunk_customers):
+    for start in range(0, len(customers), chunk_customers):
+        yield chunk_features(customers[start:start + chunk_customers])
+
+
+def build_dataset(customers, chunk_customers, min_seq=None):
+    """(X, y, seq) from all chunks, only rows with seq > min_seq if given."""
+    xs, seqs = [], []
+    for X, seq in iter_chunks(customers, chunk_customers):
+        if min_seq is not None:
+            X, seq = X[seq > min_seq], seq[seq > min_seq]
+        xs.append(X)
+        seqs.append(seq)
+    if not xs:
+        return np.empty((0, 5)), np.empty(0, dtype=int), np.empty(0, dtype=np.int64)
+    X = np.concatenate(xs)
+    return X, label(X), np.concatenate(seqs)
+
+
+# ---- Artifacts ----
+
+def versions(models_dir):
+    found = {}
+    for path in glob.glob(os.path.join(models_dir, "fraud_model-v*.joblib")):
+        m = _VERSION.search(path)
+        if m:
+            found[int(m.group(1))] = path
+    return found
+
+
+def current_meta(model_path):
+    """Metadata of the published version, or None."""
+    if not os.path.islink(model_path):
+        return None
+    meta_path = os.path.splitext(os.path.realpath(model_path))[0] + ".json"
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        return json.load(f)
+
+
+def publish(model_path, artifact):
+    """Atomically point `model_path` at `artifact` (symlink + rename)."""
+    tmp = model_path + ".tmp"
+    if os.path.lexists(tmp):
+        os.unlink(tmp)
+    os.symlink(os.path.relpath(artifact, os.path.dirname(os.path.abspath(model_path))), tmp)
+    os.replace(tmp, model_path)
+
+
+def save_version(model, meta, models_dir, model_path):
+    os.makedirs(models_dir, exist_ok=True)
+    version = max(versions(models_dir), default=0) + 1
+    base = os.path.join(models_dir, f"fraud_model-v{version:04d}")
+    joblib.dump(model, base + ".joblib.tmp")
+    os.replace(base + ".joblib.tmp", base + ".joblib")
+    meta = dict(meta, version=version, created=time.strftime("%Y-%m-%dT%H:%M:%S"))
+    with open(base + ".json", "w") as f:
+        json.dump(meta, f, indent=2)
+    publish(model_path, base + ".joblib")
+    return version, base + ".joblib"
+
+
+# ---- Training ----
+
+def fit_full(X, y, n_estimators, n_jobs):
+    model = RandomForestClassifier(n_estimators=n_estimators, n_jobs=n_jobs, random_state=0)
+    return model.fit(X, y)
+
+
+def add_trees(model, X, y, n_new, n_jobs):
+    """Warm start: keep the existing trees, fit `n_new` more on (X, y)."""
+    model.set_params(warm_start=True, n_jobs=n_jobs,
+                     n_estimators=len(model.estimators_) + n_new)
+    return model.fit(X, y)
+
+
+def train(args):
+    customers, snapshot_seq = load_customers(args.data)
+    last_seq = max((tx["_seq"] for c in customers for tx in c.get("transactions", [])),
+                   default=snapshot_seq)
+    meta = current_meta(args.model)
+    t0 = time.perf_counter()
+    tracemalloc.start()
+
+    mode = args.mode
+    if mode == "incremental":
+        reason = None
+        if meta is None:
+            reason = "no published model"
+        elif snapshot_seq > meta["watermark_seq"]:
+            reason = "ledger compacted past the model's watermark"
+        elif meta["n_estimators"] + args.trees_per_update > args.max_trees:
+            reason = f"forest would exceed {args.max_trees} trees"
+        if reason:
+            print(f"full refit: {reason}")
+            mode = "full"
+
+    if mode == "incremental":
+        X, y, _ = build_dataset(customers, args.chunk_customers, min_seq=meta["watermark_seq"])
+        if len(X) == 0 or len(set(y)) < 2:
+            print(f"nothing to add: {len(X)} new rows since seq {meta['watermark_seq']}")
+            tracemalloc.stop()
+            return
+        model = add_trees(joblib.load(args.model), X, y, args.trees_per_update, args.n_jobs)
+        rows = meta["rows"] + len(X)
+    else:
+        X, y, _ = build_dataset(customers, args.chunk_customers)
+        if args.synthetic:
+            Xs, ys = make_data(args.synthetic)
+            X, y = np.concatenate([X, Xs]), np.concatenate([y, ys])
+        model = fit_full(X, y, args.trees, args.n_jobs)
+        rows = len(X)
+
+    seconds = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    version, path = save_version(model, {
+        "mode": mode, "data": os.path.abspath(args.data), "rows": rows, "new_rows": len(X),
+        "n_estimators": len(model.estimators_), "watermark_seq": last_seq,
+        "train_seconds": round(seconds, 3), "peak_mb": round(peak / 2**20, 1),
+    }, args.models_dir, args.model)
+    print(f"v{version} ({mode}): {len(X)} rows, {len(model.estimators_)} trees, "
+          f"{seconds:.2f}s, peak {peak / 2**20:.1f} MiB -> {path}")
+
+
+# ---- Scaling report ----
+
+def synthetic_customers(n, tx_per_customer=20, seed=0):
+    rng = np.random.RandomState(seed)
+    days = np.datetime64("2025-01-01") + np.sort(rng.randint(0, 365, (n, tx_per_customer)), axis=1)
+    amounts = np.round(rng.lognormal(3.5, 1.0, (n, tx_per_customer)), 2)
+    outgoing = rng.rand(n, tx_per_customer) < 0.6
+    cps = rng.randint(0, 30, (n, tx_per_customer))
+    customers = []
+    for i in range(n):
+        txs = [{"date": str(days[i, k]), "amount": float(-amounts[i, k] if outgoing[i, k] else amounts[i, k]),
+                "description": f"Transfer to CUST{cps[i, k]:03d}" if outgoing[i, k] else "CREDIT",
+                "_seq": int(k >= tx_per_customer - 2)}
+               for k in range(tx_per_customer)]
+        customers.append({"customer_id": f"C{i}", "account": {"balance": float(rng.uniform(100, 20000))},
+                          "transactions": txs})
+    return customers
+
+
+def _measure(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak / 2**20
+
+
+def report(args):
+    print(f"{'customers':>10} {'rows':>9} {'features s':>11} {'full fit s':>11} "
+          f"{'+trees s':>9} {'peak MiB':>9}")
+    for n in (int(s) for s in args.report.split(",")):
+        customers = synthetic_customers(n)
+        (X, y, seq), feat_s, feat_mb = _measure(lambda: build_dataset(customers, args.chunk_customers))
+        # Rows with seq 1 play the role of ledger entries newer than the model
+        old, new = seq == 0, seq > 0
+        model, fit_s, fit_mb = _measure(lambda: fit_full(X[old], y[old], args.trees, args.n_jobs))
+        _, add_s, add_mb = _measure(lambda: add_trees(model, X[new], y[new],
+                                                      args.trees_per_update, args.n_jobs))
+        print(f"{n:>10} {len(X):>9} {feat_s:>11.2f} {fit_s:>11.2f} {add_s:>9.2f} "
+              f"{max(feat_mb, fit_mb, add_mb):>9.1f}")
+
+
+def rollback(args):
+    path = versions(args.models_dir).get(args.rollback)
+    if path is None:
+        raise SystemExit(f"no version {args.rollback} in {args.models_dir}")
+    publish(args.model, path)
+    print(f"{args.model} -> {path}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Fraud model training from customer data + ledger")
+    ap.add_argument("--data", default="../data/customers_transactions.json")
+    ap.add_argument("--mode", choices=("full", "incremental"), default="incremental")
+    ap.add_argument("--trees", type=int, default=100, help="forest size for a full fit")
+    ap.add_argument("--trees-per-update", type=int, default=10)
+    ap.add_argument("--max-trees", type=int, default=300)
+    ap.add_argument("--n-jobs", type=int, default=-1)
+    ap.add_argument("--chunk-customers", type=int, default=10000)
+    ap.add_argument("--synthetic", type=int, default=2000,
+                    help="make_data() rows mixed into full fits (0 = real data only)")
+    ap.add_argument("--model", default=MODEL_PATH, help="published model path (symlink)")
+    ap.add_argument("--models-dir", default=MODELS_DIR)
+    ap.add_argument("--rollback", type=int, metavar="VERSION")
+    ap.add_argument("--report", metavar="SIZES", help="e.g. 1000,10000,100000 customers")
+    args = ap.parse_args()
+    if args.report:
+        report(args)
+    elif args.rollback:
+        rollback(args)
+    else:
+        train(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,46 @@
 # llm_proxy_ollama_http.py
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context, has_request_context
 import os, requests
+from requests.adapters import HTTPAdapter
 
-import logging, json
-LOG_FILE = "/app/logs/agent.log"
+import logging, logging.handlers, json, queue, time
+from scheduler import Scheduler, QueueFull
+from prompt_stats import PromptEvalStats
+from offline_backend import OfflineBackend, FixtureRecorder
+from prometheus_client import Counter, Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Own log file per process (agent and proxy no longer share agent.log);
+# records are queued on the request path and written by a listener thread.
+LOG_FILE = os.environ.get("LOG_FILE", "/app/logs/llm_proxy.log").format(pid=os.getpid())
 os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
 
-logging.basicConfig(
-    filename=LOG_FILE,
-    level=logging.INFO,
-    format="%(asctime)s | %(levelname)s | %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S"
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps({
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+                  + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "pid": record.process,
+            "request_id": getattr(record, "request_id", None),
+            "msg": record.getMessage(),
+        }, default=str)
+
+
+_file_handler = logging.handlers.RotatingFileHandler(
+    LOG_FILE,
+    maxBytes=int(os.environ.get("LOG_MAX_BYTES", str(50 * 1024 * 1024))),
+    backupCount=int(os.environ.get("LOG_BACKUPS", "5")),
 )
+_file_handler.setFormatter(JsonFormatter())
+_log_queue = queue.SimpleQueue()
+_listener = logging.handlers.QueueListener(_log_queue, _file_handler)
+_listener.start()
+logger = logging.getLogger("llm_proxy")
+logger.setLevel(logging.INFO)
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+logger.propagate = False
 
 def log_event(entry):
     """Simple, universal logger.
@@ -20,33 +49,220 @@ def log_event(entry):
         msg = json.dumps(entry, default=str)
     else:
         msg = str(entry)
-    logging.info(msg)
+    rid = request.headers.get("X-Request-ID") if has_request_context() else None
+    logger.info(msg, extra={"request_id": rid})
 
 
 app = Flask(__name__)
 OLLAMA_BASE = os.environ.get("OLLAMA_BASE", "http://host.docker.internal:11434/api")
 MODEL = os.environ.get("OLLAMA_MODEL", "llama3.2:1b")
+KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+SYSTEM_PROMPT = "System: do not reveal PII or perform real actions. Simulate safe outputs."
+
+# "ollama" or "offline" (deterministic rule/fixture answers, no model needed)
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "ollama").lower()
+offline = None
+if LLM_BACKEND == "offline":
+    offline = OfflineBackend(
+        fixtures_path=os.environ.get("OFFLINE_FIXTURES") or None,
+        latency_ms=float(os.environ.get("OFFLINE_LATENCY_MS", "20")),
+        tokens_per_sec=float(os.environ.get("OFFLINE_TOKENS_PER_SEC", "0")),
+    )
+# Record real Ollama answers as offline fixtures (JSON lines) when set
+recorder = FixtureRecorder(os.environ["RECORD_FIXTURES"]) if os.environ.get("RECORD_FIXTURES") else None
+
+# Micro-batching scheduler; SCHED_SLOTS should match OLLAMA_NUM_PARALLEL
+scheduler = Scheduler(
+    max_batch=int(os.environ.get("SCHED_MAX_BATCH", "4")),
+    max_wait=float(os.environ.get("SCHED_MAX_WAIT_MS", "10")) / 1000,
+    max_queue=int(os.environ.get("SCHED_MAX_QUEUE", "64")),
+    slots=int(os.environ.get("SCHED_SLOTS", "4")),
+)
+
+# Keep-alive connection pool to Ollama, sized for every scheduler slot
+session = requests.Session()
+session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=scheduler.slots * 2))
+prompt_stats = PromptEvalStats()
+
+# ---- Prometheus metrics ----
+REQUESTS = Counter("llm_proxy_requests_total", "/generate requests", ["lane", "outcome"])
+QUEUE_WAIT_SECONDS = Histogram("llm_proxy_queue_wait_seconds",
+                               "Time spent waiting for a scheduler slot", ["lane"])
+UPSTREAM_SECONDS = Histogram("llm_proxy_upstream_seconds", "Ollama /generate duration", ["lane"],
+                             buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60))
+PROMPT_EVAL_SECONDS = Histogram("llm_proxy_prompt_eval_seconds",
+                                "Ollama prompt evaluation time", ["prefix"])
+
+
+class SchedulerCollector:
+    """Scheduler queue depth, in-flight slots and batching counters at scrape time."""
+
+    def collect(self):
+        s = scheduler.stats()
+        queued = GaugeMetricFamily("llm_proxy_queued", "Requests waiting per lane", labels=["lane"])
+        for lane, n in s["queued"].items():
+            queued.add_metric([lane], n)
+        yield queued
+        yield GaugeMetricFamily("llm_proxy_in_flight", "Busy Ollama slots", value=s["in_flight"])
+        yield GaugeMetricFamily("llm_proxy_slots", "Ollama slots", value=s["slots"])
+        yield GaugeMetricFamily("llm_proxy_avg_batch_size", "Average dispatched batch size",
+                                value=s["avg_batch_size"])
+        yield CounterMetricFamily("llm_proxy_batches", "Dispatched batches", value=s["batches"])
+        yield CounterMetricFamily("llm_proxy_rejected", "Requests rejected with 429",
+                                  value=s["rejected"])
+
+
+REGISTRY.register(SchedulerCollector())
+
+
+def record_prompt_eval(system, data):
+    kind = prompt_stats.record(system, data)
+    if kind:
+        PROMPT_EVAL_SECONDS.labels(kind).observe(data.get("prompt_eval_duration", 0) / 1e9)
+
+
+def ollama_body(payload, stream):
+    """Build the Ollama request with the constant text in the `system` field.
+
+    The PII guard plus the caller's system prompt (the agent sends its
+    banking prompt as "system") form an identical prefix on every call, so
+    Ollama reuses the evaluated KV cache for it instead of re-processing it;
+    only the user turn is new.
+    """
+    system = SYSTEM_PROMPT
+    if payload.get("system"):
+        system = f"{SYSTEM_PROMPT}\n\n{payload['system']}"
+    return {
+        "model": MODEL,
+        "system": system,
+        "prompt": f"User: {payload.get('prompt', '')}",
+        "stream": stream,
+        "keep_alive": KEEP_ALIVE
+    }
+
+
+def upstream_generate(body):
+    """One completion from the configured backend, as Ollama's response dict."""
+    if offline:
+        return offline.generate(body)
+    r = session.post(f"{OLLAMA_BASE}/generate", json=body, timeout=60)
+    r.raise_for_status()
+    data = r.json()
+    if recorder and data.get("response"):
+        recorder.record(body, data["response"])
+    return data
+
+
+def upstream_stream(body):
+    """Open a streaming completion; returns (iterator of Ollama chunks, close)."""
+    if offline:
+        chunks = offline.stream(body)
+        return chunks, chunks.close
+    r = session.post(f"{OLLAMA_BASE}/generate", json=body, timeout=60, stream=True)
+    r.raise_for_status()
+    return (json.loads(line) for line in r.iter_lines() if line), r.close
+
+
+def request_lane(payload):
+    """Priority lane: "interactive" (default, /chat) or "batch" (red-team/eval)."""
+    return request.headers.get("X-Priority") or payload.get("priority") or "interactive"
+
+
+def busy_response(e):
+    resp = jsonify({"output": f"[ollama-error] {e}"})
+    resp.status_code = 429
+    resp.headers["Retry-After"] = "1"
+    return resp
+
 
 @app.route("/generate", methods=["POST"])
 def generate():
     payload = request.json or {}
-    user_prompt = payload.get("prompt", "")
-    system_prompt = "System: do not reveal PII or perform real actions. Simulate safe outputs."
-    full_prompt = f"{system_prompt}\n\nUser: {user_prompt}"
-    body = {
-        "model": MODEL,
-        "prompt": full_prompt,
-        "stream": False
-    }
+    lane = request_lane(payload)
+    if payload.get("stream"):
+        return stream_generate(ollama_body(payload, True), lane)
+
+    body = ollama_body(payload, False)
     try:
-        log_event(f"")
-        r = requests.post(f"{OLLAMA_BASE}/generate", json=body, timeout=60)
-        r.raise_for_status()
-        data = r.json()
+        t0 = time.perf_counter()
+        with scheduler.slot(lane):
+            t1 = time.perf_counter()
+            QUEUE_WAIT_SECONDS.labels(lane).observe(t1 - t0)
+            data = upstream_generate(body)
+            UPSTREAM_SECONDS.labels(lane).observe(time.perf_counter() - t1)
+        record_prompt_eval(body["system"], data)
         output = data.get("completion") or data.get("response") or str(data)
+        log_event({"event": "generate", "lane": lane,
+                   "prompt_eval_count": data.get("prompt_eval_count"),
+                   "total_ms": round(data.get("total_duration", 0) / 1e6, 1)})
+        REQUESTS.labels(lane, "ok").inc()
+    except QueueFull as e:
+        log_event({"event": "rejected", "lane": lane, "reason": str(e)})
+        REQUESTS.labels(lane, "rejected").inc()
+        return busy_response(e)
     except Exception as e:
+        log_event({"event": "error", "lane": lane, "error": str(e)})
+        REQUESTS.labels(lane, "error").inc()
         output = f"[ollama-error] {e}"
     return jsonify({"output": output})
 
+
+@app.route("/stats")
+def stats():
+    return jsonify({"backend": LLM_BACKEND, "scheduler": scheduler.stats(),
+                    "prompt_eval": prompt_stats.stats()})
+
+
+@app.route("/metrics")
+def metrics():
+    return Response(generate_latest(REGISTRY), mimetype=CONTENT_TYPE_LATEST)
+
+
+def stream_generate(body, lane):
+    """Relay Ollama's NDJSON stream as {"output": <chunk>, "done": bool} lines.
+
+    When the client hangs up (e.g. the agent already has a complete action
+    object) the generator is closed, which closes the upstream connection
+    and makes Ollama stop generating.
+    """
+    # Admission (and 429) happens before the response starts; the slot is
+    # then held until the response is closed (stream done or client gone).
+    t0 = time.perf_counter()
+    try:
+        scheduler.acquire(lane)
+    except QueueFull as e:
+        REQUESTS.labels(lane, "rejected").inc()
+        return busy_response(e)
+    except TimeoutError as e:
+        REQUESTS.labels(lane, "error").inc()
+        return jsonify({"output": f"[ollama-error] {e}"})
+    QUEUE_WAIT_SECONDS.labels(lane).observe(time.perf_counter() - t0)
+
+    def relay():
+        t1 = time.perf_counter()
+        try:
+            chunks, close = upstream_stream(body)
+        except Exception as e:
+            REQUESTS.labels(lane, "error").inc()
+            yield json.dumps({"output": f"[ollama-error] {e}", "done": True}) + "\n"
+            return
+        REQUESTS.labels(lane, "ok").inc()
+        try:
+            for chunk in chunks:
+                if chunk.get("done"):
+                    record_prompt_eval(body["system"], chunk)
+                yield json.dumps({"output": chunk.get("response", ""),
+                                  "done": bool(chunk.get("done"))}) + "\n"
+                if chunk.get("done"):
+                    break
+        finally:
+            close()
+            UPSTREAM_SECONDS.labels(lane).observe(time.perf_counter() - t1)
+
+    resp = Response(stream_with_context(relay()), mimetype="application/x-ndjson")
+    resp.call_on_close(scheduler.release)
+    return resp
+
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5002)
@@ -0,0 +1,151 @@
+# offline_backend.py
+import json
+import re
+import threading
+import time
+
+# Keyword rules -> banking action, tried in order. Actions and params are the
+# agent's own vocabulary (pipeline.SYSTEM_PROMPT); anything else is clarify.
+RULES = [
+    (re.compile(r"\b(transfer|send|pay)\b"), "transfer"),
+    (re.compile(r"\b(transactions?|history|statement)\b"), "get_transactions"),
+    (re.compile(r"\b(balance|how much)\b"), "get_balance"),
+    (re.compile(r"\b(profile|info|details|address)\b"), "get_customer_info"),
+    (re.compile(r"\b(freeze|lock|block)\b"), "freeze_account"),
+]
+CUSTOMER_ID = re.compile(r"cust\d{3}")
+CLARIFY = {"message": "Could you please specify what help you need — balance, transfer, or account info?"}
+
+
+def normalize(prompt):
+    return " ".join(prompt.split()).casefold()
+
+
+def rule_output(prompt):
+    """Action JSON (as text) for a user prompt, from keyword rules."""
+    p = prompt.lower()
+    ids = CUSTOMER_ID.findall(p)
+    numbers = CUSTOMER_ID.sub(" ", p)
+    for pattern, action in RULES:
+        if pattern.search(p):
+            break
+    else:
+        return json.dumps({"action": "clarify", "params": CLARIFY})
+    params = {}
+    if action == "get_transactions":
+        n = re.search(r"\b(\d{1,2})\b", numbers)
+        params["n"] = int(n.group(1)) if n else 3
+    elif action == "transfer":
+        # The destination is the last ID mentioned ("from CUST001 to CUST002")
+        amount = re.search(r"\$?(\d+(?:\.\d+)?)", numbers)
+        params = {"to": ids[-1].upper() if ids else None,
+                  "amount": float(amount.group(1)) if amount else 0.0}
+    return json.dumps({"action": action, "params": params})
+
+
+def count_tokens(text):
+    # Rough BPE-like estimate: ~4 characters per token
+    return max(1, len(text) // 4)
+
+
+class OfflineBackend:
+    """Deterministic stand-in for Ollama's /api/generate.
+
+    Answers come from recorded fixtures (JSON lines of {"prompt", "output"},
+    matched on the whitespace/case-normalized user prompt) and otherwise
+    from keyword rules, so the same prompt always gets the same action JSON.
+    Time is simulated as `latency_ms` plus output tokens at `tokens_per_sec`
+    (0 = instant). Responses carry Ollama's stats fields; the system prefix
+    is only counted in prompt_eval_count the first time it is seen, like
+    Ollama's KV prefix cache.
+    """
+
+    def __init__(self, fixtures_path=None, latency_ms=20.0, tokens_per_sec=0.0, model="offline"):
+        self.latency = latency_ms / 1000
+        self.tokens_per_sec = tokens_per_sec
+        self.model = model
+        self.fixtures = {}
+        self._seen_systems = set()
+        self._lock = threading.Lock()
+        if fixtures_path:
+            self.load_fixtures(fixtures_path)
+
+    def load_fixtures(self, path):
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                rec = json.loads(line)
+                out = rec["output"]
+                self.fixtures[normalize(rec["prompt"])] = out if isinstance(out, str) else json.dumps(out)
+
+    def _output(self, body):
+        prompt = body.get("prompt", "")
+        if prompt.startswith("User: "):
+            prompt = prompt[len("User: "):]
+        return self.fixtures.get(normalize(prompt)) or rule_output(prompt)
+
+    def _prompt_tokens(self, body):
+        system = body.get("system", "")
+        n = count_tokens(body.get("prompt", ""))
+        with self._lock:
+            if system not in self._seen_systems:
+                self._seen_systems.add(system)
+                n += count_tokens(system)
+        return n
+
+    def _stats(self, body, output, started):
+        total = time.perf_counter() - started
+        eval_count = count_tokens(output)
+        return {
+            "model": self.model,
+            "done": True,
+            "prompt_eval_count": self._prompt_tokens(body),
+            "prompt_eval_duration": int(self.latency * 1e9),
+            "eval_count": eval_count,
+            "eval_duration": int(max(total - self.latency, 0) * 1e9),
+            "total_duration": int(total * 1e9),
+        }
+
+    def _token_delay(self, n_tokens):
+        return n_tokens / self.tokens_per_sec if self.tokens_per_sec else 0.0
+
+    def generate(self, body):
+        """Non-streaming response, same shape as Ollama's."""
+        started = time.perf_counter()
+        output = self._output(body)
+        time.sleep(self.latency + self._token_delay(count_tokens(output)))
+        data = self._stats(body, output, started)
+        data["response"] = output
+        return data
+
+    def stream(self, body):
+        """Yields Ollama-style NDJSON chunks ({"response", "done"}), one per token."""
+        started = time.perf_counter()
+        output = self._output(body)
+        time.sleep(self.latency)
+        step = self._token_delay(1)
+        for i in range(0, len(output), 4):
+            if step:
+                time.sleep(step)
+            yield {"model": self.model, "response": output[i:i + 4], "done": False}
+        final = self._stats(body, output, started)
+        final["response"] = ""
+        yield final
+
+
+class FixtureRecorder:
+    """Appends {"prompt", "output"} lines for later offline replay."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, body, output):
+        prompt = body.get("prompt", "")
+        if prompt.startswith("User: "):
+            prompt = prompt[len("User: "):]
+        line = json.dumps({"prompt": prompt, "output": output}) + "\n"
+        with self._lock, open(self.path, "a") as f:
+            f.write(line)
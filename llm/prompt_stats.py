@@ -0,0 +1,51 @@
+# prompt_stats.py
+import hashlib
+import threading
+
+
+class PromptEvalStats:
+    """Prompt-evaluation cost per system prefix, split cold vs. warm.
+
+    Ollama reports `prompt_eval_count` / `prompt_eval_duration` for the
+    tokens it actually had to evaluate; tokens served from its KV prefix
+    cache are not counted. The first request seen for a given system text is
+    "cold", later ones are "warm", so cold - warm is the measured saving
+    from reusing the constant prefix.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seen = set()
+        self._totals = {"cold": [0, 0, 0], "warm": [0, 0, 0]}  # requests, tokens, ns
+
+    def record(self, system, data):
+        """Account one Ollama response; returns "cold"/"warm" (None if no stats)."""
+        if "prompt_eval_count" not in data:
+            return None
+        key = hashlib.sha256(system.encode()).hexdigest()
+        with self._lock:
+            kind = "warm" if key in self._seen else "cold"
+            self._seen.add(key)
+            t = self._totals[kind]
+            t[0] += 1
+            t[1] += data.get("prompt_eval_count", 0)
+            t[2] += data.get("prompt_eval_duration", 0)
+        return kind
+
+    def stats(self):
+        with self._lock:
+            out = {}
+            for kind, (n, tokens, ns) in self._totals.items():
+                out[kind] = {
+                    "requests": n,
+                    "avg_prompt_eval_tokens": round(tokens / n, 1) if n else 0.0,
+                    "avg_prompt_eval_ms": round(ns / n / 1e6, 2) if n else 0.0,
+                }
+            if out["cold"]["requests"] and out["warm"]["requests"]:
+                out["saved_per_request"] = {
+                    "tokens": round(out["cold"]["avg_prompt_eval_tokens"]
+                                    - out["warm"]["avg_prompt_eval_tokens"], 1),
+                    "ms": round(out["cold"]["avg_prompt_eval_ms"]
+                                - out["warm"]["avg_prompt_eval_ms"], 2),
+                }
+            return out
@@ -0,0 +1,124 @@
+# scheduler.py
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+LANES = ("interactive", "batch")
+
+
+class QueueFull(Exception):
+    """Raised when the scheduler queue is at capacity (-> HTTP 429)."""
+
+
+class _Ticket:
+    __slots__ = ("lane", "enqueued", "event")
+
+    def __init__(self, lane):
+        self.lane = lane
+        self.enqueued = time.monotonic()
+        self.event = threading.Event()
+
+
+class Scheduler:
+    """Admission scheduler in front of the single model backend.
+
+    Request threads queue a ticket in a priority lane and block until the
+    dispatcher grants them a slot. The dispatcher coalesces arrivals: it
+    waits up to `max_wait` for up to `max_batch` tickets and then releases
+    them together, so the backend (Ollama with OLLAMA_NUM_PARALLEL > 1)
+    receives them as one parallel batch. At most `slots` requests run at
+    once; the "interactive" lane is always served before "batch".
+    """
+
+    def __init__(self, max_batch=4, max_wait=0.01, max_queue=64, slots=4):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.slots = slots
+        self._lanes = {lane: deque() for lane in LANES}
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._batches = 0
+        self._dispatched = 0
+        self._rejected = 0
+        threading.Thread(target=self._dispatch_loop, name="llm-scheduler", daemon=True).start()
+
+    def _queued(self):
+        return sum(len(q) for q in self._lanes.values())
+
+    def _oldest(self):
+        return min(q[0].enqueued for q in self._lanes.values() if q)
+
+    def acquire(self, lane="interactive", timeout=60):
+        """Queue in `lane` and block until the dispatcher grants a slot.
+
+        Raises QueueFull if the queue is at capacity, TimeoutError if no slot
+        was granted within `timeout` seconds. Pair with `release()`.
+        """
+        lane = lane if lane in self._lanes else "interactive"
+        ticket = _Ticket(lane)
+        with self._cond:
+            if self._queued() >= self.max_queue:
+                self._rejected += 1
+                raise QueueFull(f"scheduler queue full ({self.max_queue})")
+            self._lanes[lane].append(ticket)
+            self._cond.notify_all()
+
+        if not ticket.event.wait(timeout):
+            with self._cond:
+                if not ticket.event.is_set():
+                    self._lanes[lane].remove(ticket)
+                    raise TimeoutError("timed out waiting for a backend slot")
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, lane="interactive", timeout=60):
+        """Hold a backend slot for the duration of the block."""
+        self.acquire(lane, timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _dispatch_loop(self):
+        with self._cond:
+            while True:
+                queued = self._queued()
+                free = self.slots - self._in_flight
+                if not queued or free <= 0:
+                    self._cond.wait()
+                    continue
+
+                # Coalescing window: let a batch build up unless it is full
+                # already or the oldest ticket has waited long enough.
+                want = min(self.max_batch, free)
+                remaining = self._oldest() + self.max_wait - time.monotonic()
+                if queued < want and remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+
+                n = min(want, queued)
+                for lane in LANES:
+                    q = self._lanes[lane]
+                    while n and q:
+                        q.popleft().event.set()
+                        self._in_flight += 1
+                        self._dispatched += 1
+                        n -= 1
+                self._batches += 1
+
+    def stats(self):
+        with self._cond:
+            return {
+                "queued": {lane: len(q) for lane, q in self._lanes.items()},
+                "in_flight": self._in_flight,
+                "slots": self.slots,
+                "batches": self._batches,
+                "avg_batch_size": round(self._dispatched / self._batches, 2) if self._batches else 0.0,
+                "rejected": self._rejected,
+            }